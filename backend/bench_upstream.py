@@ -0,0 +1,86 @@
+"""
+Benchmark: new ClientSession per request (old get_balance) vs the shared pooled session.
+
+Starts a local getBalance stub and fires requests at it with a fixed concurrency,
+then prints requests/sec and latency percentiles for both modes.
+
+    cd backend
+    python bench_upstream.py --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+from aiohttp import web
+
+from upstream import create_session
+
+
+async def stub_balance(request: web.Request):
+    await request.read()
+    return web.json_response({"errorId": 0, "balance": 12.345})
+
+
+async def start_stub(port: int) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_post("/getBalance", stub_balance)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def call_fresh_session(url: str, _session):
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, json={"clientKey": "bench"}) as resp:
+            await resp.text()
+
+
+async def call_shared_session(url: str, session: aiohttp.ClientSession):
+    async with session.post(url, json={"clientKey": "bench"}) as resp:
+        await resp.text()
+
+
+async def run(name: str, call, url: str, total: int, concurrency: int, session=None):
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            t0 = time.perf_counter()
+            await call(url, session)
+            latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{name:<16} {total / elapsed:>10.1f} req/s   p50 {p50:>7.2f} ms   p99 {p99:>7.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    runner = await start_stub(args.port)
+    url = f"http://127.0.0.1:{args.port}/getBalance"
+    try:
+        await run("fresh session", call_fresh_session, url, args.requests, args.concurrency)
+        session = create_session()
+        try:
+            await run("shared session", call_shared_session, url, args.requests, args.concurrency, session)
+        finally:
+            await session.close()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
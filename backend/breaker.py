@@ -0,0 +1,220 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+import repo_root  # noqa: F401 — shared packages at the repository root
+from capmonster_client import CapMonsterAPIError, CapMonsterConnectionError, CapMonsterResponseError
+from metrics import Counter, Gauge
+
+# -------------------------------
+# Circuit breaker & hedging settings (override via .env)
+# -------------------------------
+UPSTREAM_CALL_TIMEOUT = float(os.getenv("UPSTREAM_CALL_TIMEOUT", "10"))  # seconds per call, retries included
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "50"))                 # last N calls per endpoint
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "20"))           # don't judge fewer calls than this
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))      # open at this share of failures
+BREAKER_SLOW_CALL = float(os.getenv("BREAKER_SLOW_CALL", "5"))          # seconds; slower calls count as slow
+BREAKER_SLOW_RATE = float(os.getenv("BREAKER_SLOW_RATE", "0.5"))        # open at this share of slow calls
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))   # fail fast this long, then probe
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "1") == "1"                  # hedge getBalance
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))           # never hedge sooner than this
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.1"))                  # at most 10% extra requests
+
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+LATENCY_SAMPLES = 200
+
+BREAKER_REJECTED = Counter("capmonster_breaker_rejected_total", "Calls failed fast by an open breaker", ("method",))
+BREAKER_TRANSITIONS = Counter("capmonster_breaker_transitions_total", "Breaker state changes", ("method", "state"))
+HEDGES = Counter("capmonster_hedges_total", "Hedged calls by the attempt that answered first", ("method", "winner"))
+
+
+class CircuitOpenError(CapMonsterConnectionError):
+    """
+    The endpoint's breaker is open — the request was not sent.
+    """
+
+
+class CircuitBreaker:
+    """
+    Closed → open when, over the last BREAKER_WINDOW calls, too many failed or were
+    slow. Open fails fast for BREAKER_OPEN_SECONDS, then one probe call is let
+    through (half-open): success closes the breaker, failure opens it again.
+    Only calls admitted in the current state count: a slow call let in while
+    closed that ends during half-open is not mistaken for the probe.
+    API errors (wrong key, zero balance, ...) are answers, not failures.
+    """
+
+    def __init__(self, name: str, window: int = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 error_rate: float = BREAKER_ERROR_RATE, slow_call: float = BREAKER_SLOW_CALL,
+                 slow_rate: float = BREAKER_SLOW_RATE, open_seconds: float = BREAKER_OPEN_SECONDS):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.generation = 0  # bumped on every state change
+        self.opened_at = 0.0
+        self._probing = False
+        self._calls: deque[tuple[bool, bool]] = deque(maxlen=window)  # (failed, slow)
+
+    def allow(self) -> tuple[int, bool] | None:
+        """
+        None if the call must fail fast. Otherwise (generation, is_probe), to be
+        handed back to record() or cancel_probe() when the call ends.
+        """
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                return None
+            self._set(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probing:
+                return None
+            self._probing = True
+            return self.generation, True
+        return self.generation, False
+
+    def record(self, admission: tuple[int, bool], failed: bool, elapsed: float):
+        generation, probe = admission
+        if generation != self.generation:
+            return  # admitted before the last state change — says nothing about this state
+        if probe:
+            self._probing = False
+            if failed:
+                self._open()
+            else:
+                self._set(CLOSED)
+                self._calls.clear()
+            return
+        self._calls.append((failed, elapsed >= self.slow_call))
+        if len(self._calls) < self.min_calls:
+            return
+        failures = sum(f for f, _ in self._calls)
+        slow = sum(s for _, s in self._calls)
+        if failures >= self.error_rate * len(self._calls) or slow >= self.slow_rate * len(self._calls):
+            self._open()
+
+    def cancel_probe(self, admission: tuple[int, bool]):
+        generation, probe = admission
+        if probe and generation == self.generation:
+            self._probing = False
+
+    def _set(self, state: int):
+        self.state = state
+        self.generation += 1
+        BREAKER_TRANSITIONS.inc(self.name, ("closed", "half_open", "open")[state])
+
+    def _open(self):
+        self._set(OPEN)
+        self.opened_at = time.monotonic()
+        self._calls.clear()
+
+
+class UpstreamGuard:
+    """
+    Every backend call to CapMonster goes through `call()`: a deadline, the
+    endpoint's circuit breaker and, for idempotent reads, a hedge — a second
+    attempt started when the first is slower than this endpoint's recent p95.
+    Whichever answers first wins and the other is cancelled. Hedges are capped
+    at HEDGE_BUDGET of all calls so a slow upstream doesn't get twice the load.
+    """
+
+    def __init__(self, timeout: float = UPSTREAM_CALL_TIMEOUT, hedge: bool = HEDGE_ENABLED,
+                 hedge_min_delay: float = HEDGE_MIN_DELAY, hedge_budget: float = HEDGE_BUDGET):
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_budget = hedge_budget
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self._latency: dict[str, deque] = {}
+        self._calls = 0
+        self._hedged = 0
+
+    def breaker(self, method: str) -> CircuitBreaker:
+        breaker = self.breakers.get(method)
+        if breaker is None:
+            breaker = self.breakers[method] = CircuitBreaker(method)
+        return breaker
+
+    def hedge_delay(self, method: str) -> float | None:
+        samples = self._latency.get(method)
+        if not samples or len(samples) < 20:
+            return None
+        ordered = sorted(samples)
+        return max(self.hedge_min_delay, ordered[int(len(ordered) * 0.95)])
+
+    async def call(self, method: str, attempt, hedge: bool = False):
+        """
+        `attempt()` is a zero-argument coroutine function doing one call.
+        Raises CircuitOpenError without calling it while the breaker is open.
+        """
+        breaker = self.breaker(method)
+        admission = breaker.allow()
+        if admission is None:
+            BREAKER_REJECTED.inc(method)
+            raise CircuitOpenError(f"{method} circuit is open")
+
+        started = time.monotonic()
+        failed = None  # stays None if the caller went away — that says nothing about upstream
+        try:
+            if hedge and self.hedge and breaker.state == CLOSED:
+                result = await asyncio.wait_for(self._hedged_call(method, attempt), self.timeout)
+            else:
+                result = await asyncio.wait_for(attempt(), self.timeout)
+            failed = False
+            return result
+        except CapMonsterAPIError:
+            failed = False
+            raise
+        except asyncio.TimeoutError:
+            failed = True
+            raise CapMonsterConnectionError(f"{method} timed out after {self.timeout:g}s")
+        except (CapMonsterConnectionError, CapMonsterResponseError):
+            failed = True
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            if failed is None:
+                breaker.cancel_probe(admission)
+            else:
+                if not failed:
+                    self._latency.setdefault(method, deque(maxlen=LATENCY_SAMPLES)).append(elapsed)
+                breaker.record(admission, failed, elapsed)
+
+    async def _hedged_call(self, method: str, attempt):
+        self._calls += 1
+        delay = self.hedge_delay(method)
+        primary = asyncio.ensure_future(attempt())
+        names = {primary: "primary"}
+        # cancelled from outside (the deadline, a caller that went away) — no attempt may outlive us
+        try:
+            if delay is None or self._hedged >= self.hedge_budget * self._calls:
+                return await primary
+
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+            self._hedged += 1
+            second = asyncio.ensure_future(attempt())
+            names[second] = "hedge"
+            pending = {primary, second}
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # an API error is an answer; a connection/response error lets the other attempt finish.
+                # Both may finish in the same round, so look at every finished one before giving up.
+                answers = ([t for t in done if t.exception() is None]
+                           or [t for t in done if isinstance(t.exception(), CapMonsterAPIError)])
+                if answers or not pending:
+                    task = (answers or list(done))[0]
+                    HEDGES.inc(method, names[task])
+                    return task.result()
+        finally:
+            for task in names:
+                task.cancel()
+
+
+def track_guard(guard: UpstreamGuard):
+    Gauge("capmonster_breaker_state", "Breaker state per endpoint: 0 closed, 1 half-open, 2 open", ("method",),
+          collect=lambda: {(m,): b.state for m, b in guard.breakers.items()})
@@ -0,0 +1,481 @@
+import asyncio
+import binascii
+import functools
+import json
+import logging
+import os
+
+import aiohttp
+from fastapi import Request
+from fastapi.responses import Response
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import ClientDisconnect
+
+import repo_root  # noqa: F401 — shared packages at the repository root
+from capmonster_client import (
+    CapMonsterAPIError,
+    CapMonsterConnectionError,
+    CapMonsterError,
+    CapMonsterResponseError,
+    decode_body,
+)
+from capmonster_client.client import dumps
+from capmonster_client.errors import api_error
+from metrics import Counter
+from breaker import UpstreamGuard
+from solver import Solver, SolverBusy
+
+# -------------------------------
+# Bulk image solving settings (override via .env)
+# -------------------------------
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "100"))            # items between upload and result, per request
+BULK_MAX_ITEM = int(os.getenv("BULK_MAX_ITEM", str(5 * 1024 * 1024)))  # bytes per item (or NDJSON line)
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(64 * 1024 * 1024)))  # base64 held per request before createTask
+BULK_MAX_FIELD = 64 * 1024                                              # bytes per form field (clientKey, task)
+DEFAULT_TASK = {"type": "ImageToTextTask"}
+IMAGES_MARK = "@@bulk-images@@"  # stands in for the images while the JSON around them is built
+
+BULK_ITEMS = Counter("bulk_items_total", "Items submitted through /solve/bulk", ("result",))
+
+
+class BulkInputError(ValueError):
+    pass
+
+
+class Base64Encoder:
+    """
+    Encodes a byte stream piece by piece. Up to two bytes are carried over
+    between pieces so every output piece ends on a 3-byte boundary and the
+    pieces simply concatenate.
+    """
+
+    def __init__(self):
+        self._carry = b""
+
+    def feed(self, data: bytes) -> bytes:
+        data = self._carry + data
+        cut = len(data) - len(data) % 3
+        self._carry = data[cut:]
+        return binascii.b2a_base64(data[:cut], newline=False) if cut else b""
+
+    def finish(self) -> bytes:
+        carry, self._carry = self._carry, b""
+        return binascii.b2a_base64(carry, newline=False) if carry else b""
+
+
+class ByteBudget:
+    """
+    A semaphore counted in bytes. Acquiring waits while the new bytes don't
+    fit and someone else holds some; `held` are the caller's own, so an item
+    bigger than the whole budget still goes through, alone.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self._freed = asyncio.Event()
+
+    async def acquire(self, size: int, held: int = 0):
+        while self.used > held and self.used + size > self.limit:
+            self._freed.clear()
+            await self._freed.wait()
+        self.used += size
+
+    def release(self, size: int):
+        self.used -= size
+        self._freed.set()
+
+
+class _Item:
+    def __init__(self, item_id: str, budget: ByteBudget):
+        self.id = item_id
+        self.images: list[list[bytes]] = []  # base64 pieces per image
+        self.size = 0
+        self.error: str | None = None
+        self.budget = budget
+        self.held = 0  # base64 bytes taken from the budget
+
+    def new_image(self):
+        self.images.append([])
+        return Base64Encoder()
+
+    async def _keep(self, piece: bytes):
+        self.images[-1].append(piece)
+        await self.budget.acquire(len(piece), held=self.held)
+        self.held += len(piece)
+
+    async def add(self, encoder: Base64Encoder, data: bytes):
+        if self.error is not None:
+            return
+        self.size += len(data)
+        if self.size > BULK_MAX_ITEM:
+            self.error = f"Item larger than {BULK_MAX_ITEM} bytes"
+            self.free()
+            return
+        piece = encoder.feed(data)
+        if piece:
+            await self._keep(piece)
+
+    async def close_image(self, encoder: Base64Encoder):
+        piece = encoder.finish()
+        if piece and self.error is None:
+            await self._keep(piece)
+
+    def free(self):
+        self.images = []
+        self.budget.release(self.held)
+        self.held = 0
+
+
+def _task_body(client_key: str, template: dict, images: list[list[bytes]], callback_url: str | None) -> list[bytes]:
+    """
+    createTask body as a list of byte pieces: the JSON around the images plus the
+    base64 pieces themselves, so no image is ever copied into one big string.
+    ImageToTextTask gets `body`, every other type `imagesBase64`.
+    """
+    task = dict(template)
+    if template.get("type") == "ImageToTextTask":
+        if len(images) != 1:
+            raise BulkInputError("ImageToTextTask takes exactly one image per item")
+        task["body"] = IMAGES_MARK
+    else:
+        task["imagesBase64"] = [IMAGES_MARK]
+    payload = {"clientKey": client_key, "task": task}
+    if callback_url:
+        payload["callbackUrl"] = callback_url
+    prefix, suffix = dumps(payload).split(json.dumps(IMAGES_MARK).encode())
+
+    pieces = [prefix]
+    for n, image in enumerate(images):
+        pieces.append(b'"' if n == 0 else b'","')
+        pieces.extend(image)
+    pieces.append(b'"')
+    pieces.append(suffix)
+    return pieces
+
+
+async def _iterate(pieces: list[bytes]):
+    for piece in pieces:
+        yield piece
+
+
+class BulkSolver:
+    """
+    Streams a batch of images in and NDJSON results out (POST /solve/bulk).
+
+    Images are base64-encoded chunk by chunk as the upload arrives and sent to
+    createTask as a list of pieces, then dropped; results are handed to the
+    Solver, so they arrive by callback like any /solve. At most
+    BULK_CONCURRENCY items of one request are between upload and result, and
+    at most BULK_MAX_BYTES of their base64 is held until createTask is sent —
+    beyond that the upload is simply not read, so memory stays flat no matter
+    how long the batch is. A result line is written as soon as its task finishes.
+    """
+
+    def __init__(self, solver: Solver, get_client, guard: UpstreamGuard, concurrency: int = BULK_CONCURRENCY,
+                 max_bytes: int = BULK_MAX_BYTES):
+        """
+        `get_client()` returns the shared CapMonsterClient (created in the app lifespan).
+        """
+        self.solver = solver
+        self._get_client = get_client
+        self.guard = guard
+        self.concurrency = concurrency
+        self.max_bytes = max_bytes
+
+    async def _create_task(self, pieces: list[bytes]) -> int:
+        return await self.guard.call("createTask", lambda: self._post_task(pieces))
+
+    async def _post_task(self, pieces: list[bytes]) -> int:
+        client = self._get_client()
+        headers = {"Content-Type": "application/json", "Content-Length": str(sum(map(len, pieces)))}
+        try:
+            async with client.session.post(f"{client.api_url}/createTask", data=_iterate(pieces),
+                                           headers=headers) as resp:
+                status, body = resp.status, await resp.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise CapMonsterConnectionError(str(e) or type(e).__name__) from e
+        data = decode_body(status, body)
+        if not isinstance(data, dict):
+            raise CapMonsterResponseError(status, body.decode("utf-8", errors="replace"))
+        if data.get("errorId", 0) != 0:
+            raise api_error(data)
+        return data["taskId"]
+
+    async def _solve(self, item_id, client_key: str, submit, free, results: asyncio.Queue,
+                     slots: asyncio.Semaphore):
+        """
+        `submit(waiter)` sends createTask for one item and returns the task id;
+        `free()` gives the item's bytes back to the budget, whatever happened.
+        """
+        line = {"id": item_id}
+        try:
+            waiter = self.solver.register(client_key)
+            try:
+                task_id = await submit(waiter)
+            except BaseException:
+                self.solver.discard(waiter)
+                raise
+            self.solver.created(waiter, task_id)
+            line["taskId"] = task_id
+            line.update(await self.solver.wait(waiter))
+        except CapMonsterAPIError as e:
+            line.update(e.response)
+        except (CapMonsterError, SolverBusy, BulkInputError) as e:
+            line["error"] = str(e) or type(e).__name__
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.exception("Bulk item %s failed", item_id)
+            line["error"] = str(e) or type(e).__name__
+        finally:
+            free()
+            slots.release()
+        BULK_ITEMS.inc("ok" if line.get("status") == "ready" else "failed")
+        results.put_nowait(line)
+
+    def _image_item(self, client_key: str, template: dict, item: _Item):
+        async def submit(waiter):
+            try:
+                if item.error is not None:
+                    raise BulkInputError(item.error)
+                pieces = _task_body(client_key, template, item.images, self.solver.callback_url(waiter))
+                item.images = []  # the pieces list is the only copy now
+                return await self._create_task(pieces)
+            finally:
+                item.free()  # the pieces are gone once this returns
+        return submit
+
+    def _ndjson_item(self, client_key: str, task: dict):
+        async def submit(waiter):
+            payload = {"clientKey": client_key, "task": task}
+            callback_url = self.solver.callback_url(waiter)
+            if callback_url:
+                payload["callbackUrl"] = callback_url
+            result = await self.guard.call("createTask", lambda: self._get_client().call("createTask", payload))
+            return result["taskId"]
+        return submit
+
+    async def _read_multipart(self, request: Request, boundary: bytes, spawn, budget: ByteBudget):
+        """
+        Form fields `clientKey` and `task` (JSON task without the image, default
+        ImageToTextTask) come first; then one file part per image. Consecutive
+        file parts with the same field name are one item (ComplexImageTask
+        with several images); the field name is the item id.
+        """
+        fields: dict[str, str] = {}
+        events: list[tuple] = []
+        state = {"headers": {}, "field": b"", "value": b"", "name": None, "file": False, "buffer": []}
+        item: _Item | None = None
+        encoder: Base64Encoder | None = None
+
+        def on_header_field(data, start, end):
+            state["field"] += data[start:end]
+
+        def on_header_value(data, start, end):
+            state["value"] += data[start:end]
+
+        def on_header_end():
+            state["headers"][state["field"].decode("latin-1").lower()] = state["value"]
+            state["field"], state["value"] = b"", b""
+
+        def on_headers_finished():
+            _, options = parse_options_header(state["headers"].get("content-disposition", b""))
+            name = options.get(b"name", b"").decode("utf-8", errors="replace")
+            state["name"], state["file"] = name, b"filename" in options
+            if state["file"]:
+                events.append(("image", name))
+            else:
+                state["buffer"] = []
+
+        def on_part_data(data, start, end):
+            chunk = data[start:end]
+            if state["file"]:
+                events.append(("data", chunk))
+            elif sum(map(len, state["buffer"])) + len(chunk) <= BULK_MAX_FIELD:
+                state["buffer"].append(chunk)
+            else:
+                raise BulkInputError(f"form field {state['name']!r} is longer than {BULK_MAX_FIELD} bytes")
+
+        def on_part_end():
+            if state["file"]:
+                events.append(("end",))
+            else:
+                fields[state["name"]] = b"".join(state["buffer"]).decode("utf-8", errors="replace")
+            state["headers"] = {}
+
+        parser = MultipartParser(boundary, {
+            "on_header_field": on_header_field, "on_header_value": on_header_value,
+            "on_header_end": on_header_end, "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data, "on_part_end": on_part_end,
+        })
+
+        client_key = template = None
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for event in events:
+                if event[0] == "image":
+                    if client_key is None:
+                        client_key = fields.get("clientKey", "").strip()
+                        if not client_key:
+                            raise BulkInputError("clientKey must come before the images")
+                        template = _parse_task(fields.get("task"))
+                    if item is None or item.id != event[1]:
+                        if item is not None:
+                            await spawn(item.id, client_key, self._image_item(client_key, template, item), item.free)
+                        item = _Item(event[1], budget)
+                    encoder = item.new_image()
+                elif event[0] == "data":
+                    await item.add(encoder, event[1])
+                else:
+                    await item.close_image(encoder)
+            events.clear()
+        parser.finalize()
+        if item is not None:
+            await spawn(item.id, client_key, self._image_item(client_key, template, item), item.free)
+
+    async def _read_ndjson(self, request: Request, spawn, budget: ByteBudget):
+        """
+        One createTask per line: {"id": ..., "clientKey": ..., "task": {...}} with the
+        image already in base64. clientKey may be left out after the first line.
+        """
+        client_key = None
+        pending = bytearray()
+        count = 0
+
+        async def handle(line: bytearray):
+            nonlocal client_key, count
+            if not line.strip():
+                return
+            count += 1
+            try:
+                data = json.loads(line)
+            except ValueError:
+                raise BulkInputError(f"line {count} is not valid JSON")
+            if not isinstance(data, dict) or not isinstance(data.get("task"), dict):
+                raise BulkInputError(f"line {count} has no task object")
+            client_key = (data.get("clientKey") or client_key or "").strip()
+            if not client_key:
+                raise BulkInputError(f"line {count} has no clientKey")
+            # the parsed line lives until its task is done
+            await budget.acquire(len(line))
+            await spawn(data.get("id", count), client_key, self._ndjson_item(client_key, data["task"]),
+                        functools.partial(budget.release, len(line)))
+
+        async for chunk in request.stream():
+            # only the new bytes are searched; a long line is not rescanned per chunk
+            scanned = len(pending)
+            pending += chunk
+            start = 0
+            while (end := pending.find(b"\n", scanned)) != -1:
+                await handle(pending[start:end])
+                start = scanned = end + 1
+            del pending[:start]
+            if len(pending) > BULK_MAX_ITEM:
+                raise BulkInputError(f"line {count + 1} is longer than {BULK_MAX_ITEM} bytes")
+        await handle(pending)
+
+    def response(self, request: Request) -> Response:
+        content_type, options = parse_options_header(request.headers.get("content-type", ""))
+        if content_type == b"multipart/form-data" and options.get(b"boundary"):
+            reader = lambda spawn, budget: self._read_multipart(  # noqa: E731
+                request, options[b"boundary"], spawn, budget)
+        else:
+            reader = lambda spawn, budget: self._read_ndjson(request, spawn, budget)  # noqa: E731
+
+        results: asyncio.Queue = asyncio.Queue()
+        slots = asyncio.Semaphore(self.concurrency)
+        budget = ByteBudget(self.max_bytes)
+        items: set[asyncio.Task] = set()
+        counts = {"items": 0, "ready": 0, "failed": 0}
+
+        async def spawn(item_id, client_key: str, submit, free):
+            # waiting here stops reading the upload — that is the backpressure
+            await slots.acquire()
+            counts["items"] += 1
+            task = asyncio.create_task(self._solve(item_id, client_key, submit, free, results, slots))
+            items.add(task)
+            task.add_done_callback(items.discard)
+
+        async def read():
+            try:
+                await reader(spawn, budget)
+            except ClientDisconnect:
+                results.put_nowait(None)
+                return
+            except BulkInputError as e:
+                results.put_nowait({"error": str(e)})
+            except Exception as e:
+                # a broken multipart body; items already submitted are still reported
+                logging.warning("Bulk upload could not be read: %s", e)
+                results.put_nowait({"error": "Unreadable upload"})
+            if items:
+                # the upload is read, so the next message can only be the disconnect
+                finished = asyncio.ensure_future(asyncio.wait(set(items)))
+                gone = asyncio.ensure_future(_disconnected(request))
+                await asyncio.wait({finished, gone}, return_when=asyncio.FIRST_COMPLETED)
+                finished.cancel()
+                gone.cancel()
+            results.put_nowait(None)
+
+        async def lines():
+            reading = asyncio.create_task(read())
+            try:
+                while True:
+                    line = await results.get()
+                    if line is None:
+                        break
+                    if "id" in line:
+                        counts["ready" if line.get("status") == "ready" else "failed"] += 1
+                    yield dumps(line) + b"\n"
+                yield dumps({"summary": counts}) + b"\n"
+            finally:
+                reading.cancel()
+                for task in list(items):
+                    task.cancel()
+
+        return _DuplexResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+
+def _parse_task(raw: str | None) -> dict:
+    if not raw:
+        return dict(DEFAULT_TASK)
+    try:
+        task = json.loads(raw)
+    except ValueError:
+        raise BulkInputError("task is not valid JSON")
+    if not isinstance(task, dict) or "type" not in task:
+        raise BulkInputError("task must be an object with a type")
+    return task
+
+
+async def _disconnected(request: Request):
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+class _DuplexResponse(Response):
+    """
+    Results go out while the upload is still coming in. Starlette's
+    StreamingResponse listens for the client disconnecting by reading the
+    request, which would swallow upload chunks — here the reader watches
+    for the disconnect itself once the upload is read. So this streams through the plain ASGI send calls
+    and relies on no StreamingResponse internals.
+    """
+
+    def __init__(self, lines, media_type: str, headers: dict[str, str]):
+        # no `body`, so init_headers adds no Content-Length
+        self.status_code = 200
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+        self.lines = lines
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            async for line in self.lines:
+                await send({"type": "http.response.body", "body": line, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            await self.lines.aclose()
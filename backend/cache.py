@@ -0,0 +1,85 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+# -------------------------------
+# Balance cache settings (override via .env)
+# -------------------------------
+BALANCE_CACHE_TTL = float(os.getenv("BALANCE_CACHE_TTL", "10"))
+BALANCE_CACHE_SIZE = int(os.getenv("BALANCE_CACHE_SIZE", "10000"))
+BALANCE_STALE_MAX = float(os.getenv("BALANCE_STALE_MAX", "3600"))  # serve results this old while upstream is down
+
+
+def hash_key(client_key: str) -> str:
+    """
+    Client keys are never stored as-is — only their SHA-256 digest.
+    """
+    return hashlib.sha256(client_key.encode()).hexdigest()
+
+
+class BalanceCache:
+    """
+    In-process TTL + LRU cache for getBalance results.
+    Concurrent misses for the same key share a single upstream request.
+    Expired entries are kept (up to `stale_max`) as the last known good value:
+    when the refresh fails — upstream down, breaker open — that is served instead.
+    """
+
+    def __init__(self, ttl: float = BALANCE_CACHE_TTL, max_size: int = BALANCE_CACHE_SIZE,
+                 stale_max: float = BALANCE_STALE_MAX):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stale_max = stale_max
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def get(self, client_key: str, fetch) -> tuple[dict, float, str]:
+        """
+        Returns (data, age in seconds, "HIT" / "MISS" / "STALE"). `fetch` is a
+        zero-argument coroutine function that is awaited only when there is no
+        fresh entry. Its exception is raised only if there is nothing stale to serve.
+        """
+        key = hash_key(client_key)
+        now = time.monotonic()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, data = entry
+            if now - stored_at < self.ttl:
+                self._entries.move_to_end(key)
+                return data, now - stored_at, "HIT"
+            if now - stored_at >= self.stale_max:
+                del self._entries[key]
+                entry = None
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, fetch))
+            self._inflight[key] = task
+        try:
+            # shield — one caller disconnecting must not cancel the shared request
+            data = await asyncio.shield(task)
+        except Exception:
+            if entry is None:
+                raise
+            stored_at, data = entry
+            return data, time.monotonic() - stored_at, "STALE"
+        return data, 0.0, "MISS"
+
+    async def _load(self, key: str, fetch) -> dict:
+        try:
+            data = await fetch()
+            # only successful answers are cached, errors are retried next time
+            if isinstance(data, dict) and data.get("errorId") == 0:
+                self._entries[key] = (time.monotonic(), data)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            return data
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
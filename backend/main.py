@@ -1,13 +1,53 @@
-from fastapi import FastAPI, Form
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Form, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-import aiohttp, json
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+import asyncio, json, os
 
-app = FastAPI()
+import repo_root  # noqa: F401 — shared packages at the repository root
+from cache import BalanceCache
+from metrics import MetricsMiddleware, render_metrics
+from prices import parse_mix, price_table
+from proxy import proxy_request
+from solver import Solver, SolverBusy, track_solver
+from static_files import SERVE_STATIC, StaticFiles
+from streams import STREAM_HEARTBEAT, BalanceHub, track_hub
+from upstream import create_client, create_session
+from breaker import UpstreamGuard, track_guard
+from bulk import BulkSolver
+from balance_history import BalanceHistory
+from capmonster_client import (
+    CapMonsterAPIError,
+    CapMonsterClient,
+    CapMonsterConnectionError,
+    CapMonsterError,
+    CapMonsterResponseError,
+    UserAgentCache,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # one pooled session (and client on top of it) for the whole app lifetime
+    session = create_session()
+    app.state.capmonster = create_client(session)
+    await balance_history.start()
+    await user_agent.start()
+    yield
+    await user_agent.close()
+    await balance_history.close()
+    await solver.close()
+    await balance_hub.close()
+    await session.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
-    "http://localhost:8080",                
+    "http://localhost:8080",
     "http://127.0.0.1:8080",
-    "https://capmonster-assistant.vercel.app" 
+    "https://capmonster-assistant.vercel.app"
 ]
 
 # Allowing the frontend to access the backend
@@ -17,29 +57,344 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Cache", "X-Cache-Age"],
+)
+app.add_middleware(MetricsMiddleware)
+
+USER_AGENT_TTL = float(os.getenv("USER_AGENT_TTL", "3600"))  # refreshed in the background at 80% of this
+
+balance_cache = BalanceCache()
+balance_history = BalanceHistory()
+upstream_guard = UpstreamGuard()
+track_guard(upstream_guard)
+balance_hub = BalanceHub(lambda clientKey: fetch_balance(app.state.capmonster, clientKey))
+track_hub(balance_hub)
+
+
+async def guarded_call(method: str, payload: dict, idempotent: bool = False) -> dict:
+    # deadline + per-endpoint circuit breaker around the shared client
+    return await upstream_guard.call(
+        method, lambda: app.state.capmonster.call(method, payload, idempotent=idempotent)
+    )
+
+
+# refreshed in the background before it expires; requests only read the cached value
+user_agent = UserAgentCache(
+    lambda: upstream_guard.call("getUserAgent", app.state.capmonster.get_user_agent),
+    ttl=USER_AGENT_TTL,
 )
 
-CAP_URL = "https://api.capmonster.cloud/getBalance"
+solver = Solver(guarded_call)
+track_solver(solver)
+bulk_solver = BulkSolver(solver, lambda: app.state.capmonster, upstream_guard)
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "10"))
+BATCH_KEY_TIMEOUT = float(os.getenv("BATCH_KEY_TIMEOUT", "10"))
+BATCH_MAX_KEYS = int(os.getenv("BATCH_MAX_KEYS", "100"))
+PRICES_MAX_AGE = int(os.getenv("PRICES_MAX_AGE", "300"))
+
+
+async def fetch_balance(client: CapMonsterClient, clientKey: str) -> dict:
+    """
+    Makes a getBalance request to CapMonster over the shared client, behind the
+    getBalance breaker and hedged when it is slower than usual.
+    API errors are returned as CapMonster sent them; an upstream failure raises.
+    """
+    try:
+        # the client parses once and unwraps JSON that was sent as a string
+        data = await upstream_guard.call(
+            "getBalance", lambda: client.call("getBalance", {"clientKey": clientKey}, idempotent=True), hedge=True,
+        )
+    except CapMonsterAPIError as e:
+        return e.response
+    if isinstance(data.get("balance"), (int, float)):
+        balance_history.record(clientKey, data["balance"])
+    return data
+
+
+async def cached_balance(clientKey: str) -> tuple[dict, float, str]:
+    """
+    The balance from cache or CapMonster. While upstream fails (or its breaker is
+    open) the last known good value is served as "STALE"; without one the failure
+    comes back as an error body.
+    """
+    try:
+        return await balance_cache.get(clientKey, lambda: fetch_balance(app.state.capmonster, clientKey))
+    except CapMonsterResponseError as e:
+        # if it didn't work at all — we return the raw text
+        return {"error": "Unexpected response", "raw": e.raw, "status": e.status}, 0.0, "MISS"
+    except CapMonsterConnectionError as e:
+        return {"error": "CapMonster is unavailable", "detail": str(e)}, 0.0, "MISS"
+
 
 @app.post("/get_balance")
-async def get_balance(clientKey: str = Form(...)):
+async def get_balance(response: Response, clientKey: str = Form(...)):
     """
     Accepts API key, makes a request to CapMonster, returns balance.
+    Recent results are served from cache; X-Cache-Age tells how old they are.
     """
-    async with aiohttp.ClientSession() as session:
-        async with session.post(CAP_URL, json={"clientKey": clientKey}) as resp:
-            text = await resp.text()
+    data, age, state = await cached_balance(clientKey)
+    response.headers["X-Cache"] = state
+    response.headers["X-Cache-Age"] = f"{age:.1f}"
+    if data.get("error") == "CapMonster is unavailable":
+        response.status_code = 503
+    return data
+
+
+@app.post("/balance/history")
+async def get_balance_history(clientKey: str = Form(...)):
+    """
+    Spend over the last hour, day and week from the balances this backend has
+    seen for the key, and how long the balance lasts at that rate.
+    """
+    clientKey = clientKey.strip()
+    data, age, state = await cached_balance(clientKey)
+    summary = balance_history.summary(clientKey)
+    if summary is None:
+        status = 503 if data.get("error") == "CapMonster is unavailable" else 404
+        return JSONResponse({"error": "No balance history for this key", "balance": data}, status_code=status)
+    return summary
+
+
+class BatchBalanceRequest(BaseModel):
+    clientKeys: list[str]
+
+
+def mask_key(clientKey: str) -> str:
+    return f"{clientKey[:4]}…{clientKey[-4:]}" if len(clientKey) > 8 else "…"
+
+
+@app.post("/get_balance/batch")
+async def get_balance_batch(body: BatchBalanceRequest):
+    """
+    Checks many API keys at once. Keys are fanned out concurrently (bounded by
+    BATCH_CONCURRENCY), each with its own timeout; a failing key never fails the batch.
+    Results come back in the same order as the keys.
+    """
+    if len(body.clientKeys) > BATCH_MAX_KEYS:
+        raise HTTPException(status_code=400, detail=f"Too many keys (max {BATCH_MAX_KEYS})")
+
+    sem = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def one(clientKey: str) -> dict:
+        async with sem:
             try:
-                # first we try to parse plain JSON
-                data = await resp.json()
-            except Exception:
+                data, age, state = await asyncio.wait_for(cached_balance(clientKey), timeout=BATCH_KEY_TIMEOUT)
+                return {"key": mask_key(clientKey), "data": data, "cacheAge": round(age, 1)}
+            except asyncio.TimeoutError:
+                return {"key": mask_key(clientKey), "data": {"error": "Timeout"}}
+            except Exception as e:
+                return {"key": mask_key(clientKey), "data": {"error": "Connection error", "detail": str(e)}}
+
+    results = await asyncio.gather(*(one(k.strip()) for k in body.clientKeys))
+    return {"results": results}
+
+
+@app.get("/prices")
+async def get_prices(request: Request):
+    """
+    prices.json from memory, with ETag so clients can revalidate for free.
+    """
+    table = price_table.current()
+    headers = {"ETag": table.etag, "Cache-Control": f"public, max-age={PRICES_MAX_AGE}"}
+    if request.headers.get("if-none-match") == table.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=table.raw, media_type="application/json", headers=headers)
+
+
+class EstimateScenario(BaseModel):
+    balance: float
+    mix: dict[str, float] | str | None = None
+
+
+class EstimateRequest(BaseModel):
+    balance: float | None = None
+    clientKey: str | None = None
+    mix: dict[str, float] | str | None = None
+    scenarios: list[EstimateScenario] = []
+
+
+@app.post("/estimate")
+async def estimate(body: EstimateRequest):
+    """
+    How many captchas of each type a balance buys, optionally for a workload mix
+    ("60% Turnstile, 40% RecaptchaV2"). Takes a balance, a clientKey (balance is fetched)
+    and/or a list of scenarios. `pricesVersion` is the ETag of the price table used.
+    """
+    table = price_table.current()
+    scenarios = list(body.scenarios)
+
+    balance = body.balance
+    if balance is None and body.clientKey:
+        clientKey = body.clientKey.strip()
+        data, age, state = await cached_balance(clientKey)
+        balance = data.get("balance") if isinstance(data, dict) else None
+        if balance is None:
+            detail = data.get("errorDescription") or data.get("errorCode") or data.get("error") \
+                if isinstance(data, dict) else "Unexpected response"
+            raise HTTPException(status_code=502, detail=detail or "Unknown error")
+    if balance is not None:
+        scenarios.insert(0, EstimateScenario(balance=balance, mix=body.mix))
+    if not scenarios:
+        raise HTTPException(status_code=400, detail="Provide balance, clientKey or scenarios")
+
+    try:
+        balances = [sc.balance for sc in scenarios]
+        solves = table.solves(balances)
+        results = []
+        for sc, row in zip(scenarios, solves):
+            item = {"balance": sc.balance, "solves": dict(zip(table.names, row))}
+            mix = sc.mix if sc.mix is not None else body.mix
+            if mix:
+                weights = table.mix_weights(parse_mix(mix))
+                item["mix"] = table.mix_solves([sc.balance], weights)[0]
+            results.append(item)
+    except (KeyError, ValueError) as e:
+        # str() of a KeyError is the repr of its message — take the message itself
+        raise HTTPException(status_code=400, detail=str(e.args[0]) if e.args else str(e))
+
+    return {"pricesVersion": table.etag, "results": results}
+
+
+@app.post("/stream/balance")
+async def stream_balance(clientKey: str = Form(...)):
+    """
+    Server-Sent Events with the key's balance. Every open dashboard for the same
+    key shares one upstream poller; an event is sent only when the value changes.
+    The key travels in the POST body so it never shows up in URLs or access logs.
+    """
+    clientKey = clientKey.strip()
+
+    async def events():
+        async with balance_hub.subscribe(clientKey) as queue:
+            while True:
                 try:
-                    # if CapMonster returned JSON as a string — let's parse it again
-                    data = json.loads(text)
-                except Exception:
-                    # if it didn't work at all — we return the raw text
-                    data = {"error": "Unexpected response", "raw": text, "status": resp.status}
-    return data
+                    data = await asyncio.wait_for(queue.get(), timeout=STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: balance\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/user_agent")
+async def get_user_agent():
+    """
+    The current user agent for solving tasks, from a cache that is refreshed in
+    the background — never an upstream call. If a refresh has failed, the last
+    value is served with "stale": true.
+    """
+    if user_agent.value is None:
+        return JSONResponse({"error": "User agent is not loaded yet"}, status_code=503, headers={"Retry-After": "5"})
+    max_age = max(0, int(user_agent.ttl - user_agent.age))
+    return JSONResponse(
+        {"userAgent": user_agent.value, "age": round(user_agent.age), "stale": user_agent.stale},
+        headers={"Cache-Control": f"public, max-age={max_age}"},
+    )
+
+
+@app.api_route("/proxy/{method}", methods=["GET", "POST"])
+async def proxy(method: str, request: Request):
+    """
+    Passthrough for createTask, getTaskResult (POST, JSON body as CapMonster expects it)
+    and getUserAgent (GET). The upstream body is streamed back untouched.
+    """
+    return await proxy_request(app.state.capmonster.session, upstream_guard, method, request)
+
+
+class SolveRequest(BaseModel):
+    clientKey: str
+    task: dict
+
+
+@app.post("/solve")
+async def solve(body: SolveRequest, stream: bool = False):
+    """
+    createTask + wait for the result in one call. CapMonster pushes the result to
+    /solve/callback/… (SOLVE_PUBLIC_URL); getTaskResult polling is only the fallback.
+    Long-poll by default; with ?stream=1 it is Server-Sent Events: "created" with the
+    taskId right away, then "result".
+    """
+    try:
+        waiter = await solver.submit(body.clientKey.strip(), {"task": body.task})
+    except SolverBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except CapMonsterAPIError as e:
+        return e.response
+    except CapMonsterError as e:
+        return JSONResponse(status_code=502, content={"error": "Connection error", "detail": str(e)})
+
+    if not stream:
+        result = await solver.wait(waiter)
+        return {"taskId": waiter.task_id, **result}
+
+    async def events():
+        yield f"event: created\ndata: {json.dumps({'taskId': waiter.task_id})}\n\n"
+        wait = asyncio.ensure_future(solver.wait(waiter))
+        try:
+            while True:
+                done, _ = await asyncio.wait({wait}, timeout=STREAM_HEARTBEAT)
+                if done:
+                    break
+                yield ": keep-alive\n\n"
+            yield f"event: result\ndata: {json.dumps({'taskId': waiter.task_id, **wait.result()})}\n\n"
+        finally:
+            wait.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/solve/bulk")
+async def solve_bulk(request: Request):
+    """
+    Many image tasks in one request: multipart/form-data (clientKey, task, then one file
+    per image) or NDJSON (one createTask body per line). Results stream back as NDJSON,
+    one line per item as soon as it is solved, then a summary line.
+    """
+    return bulk_solver.response(request)
+
+
+@app.post("/solve/callback/{token}")
+async def solve_callback(token: str, request: Request):
+    """
+    Receives CapMonster's callbackUrl POST (the getTaskResult body) and wakes the waiting /solve.
+    """
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Expected a JSON body")
+    if not isinstance(data, dict) or not solver.callback(token, data):
+        raise HTTPException(status_code=404, detail="Unknown task")
+    return {"status": "ok"}
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus text exposition format.
+    """
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+if SERVE_STATIC:
+    static_files = StaticFiles()
+
+    @app.get("/static/{path:path}")
+    async def static(path: str, request: Request):
+        """
+        The built frontend (frontend/dist) with precompressed variants,
+        immutable caching for hashed assets and ETag revalidation.
+        """
+        return static_files.response(path, request)
 
 
 @app.get("/ping")
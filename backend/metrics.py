@@ -0,0 +1,216 @@
+import time
+from bisect import bisect_left
+
+import aiohttp
+from starlette.routing import Match
+
+# -------------------------------
+# Minimal Prometheus instrumentation.
+# Everything runs on the event loop thread, so plain ints/floats need no locks;
+# histogram buckets are allocated once per label set and observe() is a bisect
+# plus two additions.
+# -------------------------------
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+
+def _labels_text(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: dict[tuple, float] = {}
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels_text(self.labelnames, labels)} {value}"
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, labelnames=(), collect=None):
+        """
+        `collect`, if given, is called at scrape time and returns {labels: value}.
+        """
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: dict[tuple, float] = {}
+        self._collect = collect
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, *labels, value: float):
+        self._values[labels] = value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        values = self._collect() if self._collect else self._values
+        for labels, value in values.items():
+            yield f"{self.name}{_labels_text(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: dict[tuple, list] = {}
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        names = self.labelnames + ("le",)
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                yield f"{self.name}_bucket{_labels_text(names, labels + (bound,))} {cumulative}"
+            yield f"{self.name}_sum{_labels_text(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{_labels_text(self.labelnames, labels)} {count}"
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -------------------------------
+# Backend metrics
+# -------------------------------
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests handled", ("route", "method", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ("route",))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled", ("route",))
+
+UPSTREAM_LATENCY = Histogram("capmonster_request_duration_seconds", "CapMonster API latency", ("method",))
+UPSTREAM_RESPONSES = Counter("capmonster_responses_total", "CapMonster API responses", ("method", "status"))
+UPSTREAM_PARSE = Counter(
+    "capmonster_parse_total",
+    "How CapMonster bodies were decoded: json, string (JSON sent as a string) or raw (not JSON)",
+    ("method", "result"),
+)
+
+_pools: list[aiohttp.TCPConnector] = []
+
+
+def _collect_pool():
+    active = idle = limit = 0
+    for connector in _pools:
+        if connector.closed:
+            continue
+        # aiohttp has no public API for this — read the pool bookkeeping directly
+        active += len(getattr(connector, "_acquired", ()))
+        idle += sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+        limit += connector.limit
+    return {("active",): active, ("idle",): idle, ("limit",): limit}
+
+
+UPSTREAM_POOL = Gauge("capmonster_pool_connections", "Upstream connection pool usage", ("state",),
+                      collect=_collect_pool)
+
+
+def track_pool(connector: aiohttp.TCPConnector):
+    _pools[:] = [c for c in _pools if not c.closed]
+    _pools.append(connector)
+
+
+def upstream_trace_config() -> aiohttp.TraceConfig:
+    """
+    Times every request made through the upstream session.
+    """
+    trace = aiohttp.TraceConfig()
+
+    async def on_start(session, ctx, params):
+        ctx.started = time.perf_counter()
+
+    async def on_end(session, ctx, params):
+        method = params.url.path.strip("/")
+        UPSTREAM_LATENCY.observe(time.perf_counter() - ctx.started, method)
+        UPSTREAM_RESPONSES.inc(method, params.response.status)
+
+    async def on_exception(session, ctx, params):
+        method = params.url.path.strip("/")
+        UPSTREAM_LATENCY.observe(time.perf_counter() - ctx.started, method)
+        UPSTREAM_RESPONSES.inc(method, type(params.exception).__name__)
+
+    trace.on_request_start.append(on_start)
+    trace.on_request_end.append(on_end)
+    trace.on_request_exception.append(on_exception)
+    return trace
+
+
+def record_decode(method: str, result: str):
+    UPSTREAM_PARSE.inc(method, result)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware overhead). Routes are labelled by
+    their path template; unknown paths share the "unmatched" label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_cache: dict[tuple[str, str], str] = {}
+
+    def _route_for(self, scope) -> str:
+        key = (scope["method"], scope["path"])
+        route = self._route_cache.get(key)
+        if route is None:
+            route = "unmatched"
+            for candidate in scope["app"].router.routes:
+                match, _ = candidate.matches(scope)
+                if match != Match.NONE:
+                    route = getattr(candidate, "path", "unmatched")
+                    break
+            if len(self._route_cache) < 1000:
+                self._route_cache[key] = route
+        return route
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        route = self._route_for(scope)
+        status = 500
+        started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc(route)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(route)
+            HTTP_LATENCY.observe(time.perf_counter() - started, route)
+            HTTP_REQUESTS.inc(route, scope["method"], status)
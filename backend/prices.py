@@ -0,0 +1,134 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+from array import array
+
+# -------------------------------
+# Price table (frontend/prices.json)
+# -------------------------------
+PRICES_PATH = os.getenv(
+    "PRICES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend", "prices.json"),
+)
+
+
+class PriceTable:
+    """
+    prices.json kept in memory as parallel arrays: names, prices (array of doubles)
+    and the raw entries for clients. Reloaded automatically when the file changes;
+    a missing or broken file is logged and the last good table stays in use.
+    """
+
+    def __init__(self, path: str = PRICES_PATH):
+        self.path = path
+        self.names: tuple[str, ...] = ()
+        self.prices = array("d")
+        self.entries: list[dict] = []
+        self.raw = b"[]"
+        self.etag = ""
+        self._index: dict[str, int] = {}
+        self._stamp = None
+        self._error: str | None = None  # last reported problem, so it is logged once
+
+    def current(self) -> "PriceTable":
+        """
+        Cheap stat() on every call; the file is parsed only when it has changed.
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError as e:
+            # e.g. replaced by a deploy right now — try again on the next call
+            self._report(f"not readable: {e}")
+            return self
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp != self._stamp:
+            try:
+                self._load()
+                self._error = None
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self._report(f"broken: {e}")
+            # a half-written file gets a new stamp once it is complete; don't re-parse it until then
+            self._stamp = stamp
+        return self
+
+    def _report(self, error: str):
+        if error != self._error:
+            logging.error("Price table %s is %s — keeping the previous one", self.path, error)
+            self._error = error
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        entries = json.loads(raw)
+        names = tuple(e["name"] for e in entries)
+        prices = array("d", (float(e["price"]) for e in entries))
+        # swapped in only once everything has parsed
+        self.names, self.prices, self.entries, self.raw = names, prices, entries, raw
+        self._index = {name.lower(): i for i, name in enumerate(names)}
+        self.etag = '"' + hashlib.sha256(raw).hexdigest()[:32] + '"'
+
+    def index_of(self, name: str) -> int:
+        """
+        Exact name first, then "<name>Task", then a unique prefix ("Turnstile" → TurnstileTask).
+        """
+        key = name.strip().lower()
+        for candidate in (key, key + "task"):
+            if candidate in self._index:
+                return self._index[candidate]
+        matches = [i for n, i in self._index.items() if n.startswith(key)]
+        if len(matches) == 1:
+            return matches[0]
+        raise KeyError(f"Unknown task type: {name}")
+
+    def solves(self, balances: list[float]) -> list[list[int]]:
+        """
+        How many solves of each task type every balance buys.
+        """
+        prices = self.prices
+        return [[math.floor(b / p) if p > 0 else 0 for p in prices] for b in balances]
+
+    def mix_weights(self, mix: dict[str, float]) -> list[tuple[int, float]]:
+        """
+        Turns {"TurnstileTask": 60, "RecaptchaV2Task": 40} into normalized (index, weight) pairs.
+        """
+        total = sum(mix.values())
+        if total <= 0 or any(v < 0 for v in mix.values()):
+            raise ValueError("Workload mix weights must be non-negative and not all zero")
+        return [(self.index_of(name), share / total) for name, share in mix.items()]
+
+    def mix_solves(self, balances: list[float], weights: list[tuple[int, float]]) -> list[dict]:
+        """
+        Solves per balance for a blended workload, plus the per-type split.
+        """
+        prices = self.prices
+        blended = sum(prices[i] * w for i, w in weights)
+        result = []
+        for b in balances:
+            total = math.floor(b / blended) if blended > 0 else 0
+            result.append({
+                "pricePerSolve": round(blended, 8),
+                "totalSolves": total,
+                "byType": {self.names[i]: int(total * w) for i, w in weights},
+            })
+        return result
+
+
+def parse_mix(mix) -> dict[str, float]:
+    """
+    Accepts either {"TurnstileTask": 60, ...} or a string like "60% Turnstile, 40% RecaptchaV2".
+    """
+    if isinstance(mix, dict):
+        return mix
+    parsed = {}
+    for part in mix.split(","):
+        m = re.fullmatch(r"\s*([\d.]+)\s*%?\s+(.+?)\s*", part)
+        if not m:
+            raise ValueError(f"Cannot parse workload mix part: {part.strip()!r}")
+        parsed[m.group(2)] = float(m.group(1))
+    return parsed
+
+
+price_table = PriceTable()
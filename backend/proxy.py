@@ -0,0 +1,132 @@
+import asyncio
+import os
+
+import aiohttp
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+import repo_root  # noqa: F401 — shared packages at the repository root
+from upstream import CAPMONSTER_API
+from breaker import CircuitOpenError
+from capmonster_client import CapMonsterConnectionError, CapMonsterResponseError
+
+# -------------------------------
+# Passthrough proxy settings (override via .env)
+# -------------------------------
+PROXY_MAX_BODY = int(os.getenv("PROXY_MAX_BODY", str(20 * 1024 * 1024)))  # bytes; base64 images are big
+PROXY_CHUNK_SIZE = 64 * 1024
+
+# public method name -> (HTTP method, upstream path)
+PROXY_METHODS = {
+    "createTask": ("POST", "createTask"),
+    "getTaskResult": ("POST", "getTaskResult"),
+    "getUserAgent": ("GET", "useragent/actual"),
+}
+# headers copied from the upstream response as-is
+PASSTHROUGH_HEADERS = ("Content-Type", "Content-Length", "Content-Encoding")
+
+
+async def proxy_request(session: aiohttp.ClientSession, guard, method: str, request: Request):
+    """
+    Forwards the request body to CapMonster and streams the response back
+    without decoding it: bodies are relayed chunk by chunk in both directions
+    and compressed responses stay compressed. Nothing is retried — a streamed
+    body can't be replayed, and createTask must not be sent twice.
+    The call goes through `guard` (UpstreamGuard) like every other upstream call:
+    deadline and circuit breaker; 5xx answers are relayed but count as failures.
+    """
+    if method not in PROXY_METHODS:
+        raise HTTPException(status_code=404, detail=f"Unknown method {method}")
+    http_method, path = PROXY_METHODS[method]
+    if request.method != http_method:
+        raise HTTPException(status_code=405, detail=f"{method} expects {http_method}")
+
+    headers = {"Accept-Encoding": request.headers.get("accept-encoding", "identity")}
+    kwargs = {}
+    if http_method == "POST":
+        length = request.headers.get("content-length")
+        if length is not None:
+            if not length.isdigit():
+                raise HTTPException(status_code=400, detail="Invalid Content-Length")
+            if int(length) > PROXY_MAX_BODY:
+                raise HTTPException(status_code=413, detail="Request body too large")
+            # with a known length aiohttp streams the body without chunked encoding
+            headers["Content-Length"] = length
+        headers["Content-Type"] = request.headers.get("content-type", "application/json")
+        kwargs["data"] = _limited(request.stream()) if length is None else request.stream()
+
+    async def attempt() -> aiohttp.ClientResponse:
+        try:
+            upstream = await session.request(
+                http_method, f"{CAPMONSTER_API.rstrip('/')}/{path}",
+                headers=headers, auto_decompress=False, **kwargs,
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # aiohttp wraps errors raised while sending the body
+            if isinstance(e.__cause__, _BodyTooLarge):
+                raise HTTPException(status_code=413, detail="Request body too large")
+            raise CapMonsterConnectionError(str(e) or type(e).__name__) from e
+        if upstream.status >= 500:
+            raise _UpstreamFailed(upstream)
+        return upstream
+
+    try:
+        upstream = await guard.call(method, attempt)
+    except _UpstreamFailed as e:
+        upstream = e.upstream
+    except CircuitOpenError as e:
+        return JSONResponse(status_code=503, content={"error": "CapMonster is unavailable", "detail": str(e)})
+    except CapMonsterConnectionError as e:
+        return JSONResponse(status_code=502, content={"error": "Connection error", "detail": str(e)})
+
+    try:
+        return _RelayResponse(upstream)
+    except BaseException:
+        upstream.release()
+        raise
+
+
+class _UpstreamFailed(CapMonsterResponseError):
+    """
+    A 5xx from CapMonster: a failure for the breaker, still relayed to the client as-is.
+    """
+
+    def __init__(self, upstream: aiohttp.ClientResponse):
+        super().__init__(upstream.status, "")
+        self.upstream = upstream
+
+
+class _RelayResponse(StreamingResponse):
+    """
+    Streams an upstream response and releases it however the stream ends —
+    including a client that is gone before the first chunk, when the body
+    iterator never starts and its own cleanup never runs.
+    """
+
+    def __init__(self, upstream: aiohttp.ClientResponse):
+        super().__init__(
+            upstream.content.iter_chunked(PROXY_CHUNK_SIZE),
+            status_code=upstream.status,
+            headers={h: upstream.headers[h] for h in PASSTHROUGH_HEADERS if h in upstream.headers},
+        )
+        self.upstream = upstream
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.upstream.release()
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+async def _limited(stream):
+    # chunked uploads have no Content-Length to check up front
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > PROXY_MAX_BODY:
+            raise _BodyTooLarge()
+        yield chunk
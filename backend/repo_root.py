@@ -0,0 +1,11 @@
+"""
+Puts the repository root on sys.path so the shared packages next to this
+directory (capmonster_client, balance_history) can be imported. Every module
+that uses them imports this first, so each one also works on its own.
+"""
+import os
+import sys
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,228 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import secrets
+import time
+from dataclasses import dataclass, field
+
+import repo_root  # noqa: F401 — shared packages at the repository root
+from capmonster_client import CapMonsterAPIError
+from metrics import Counter, Gauge
+
+# -------------------------------
+# /solve settings (override via .env)
+# -------------------------------
+SOLVE_PUBLIC_URL = os.getenv("SOLVE_PUBLIC_URL", "").rstrip("/")      # how CapMonster reaches us; empty = poll only
+SOLVE_TIMEOUT = float(os.getenv("SOLVE_TIMEOUT", "180"))               # give up on a task after N seconds
+SOLVE_CALLBACK_GRACE = float(os.getenv("SOLVE_CALLBACK_GRACE", "30"))  # wait this long for the callback before polling
+SOLVE_POLL_INTERVAL = float(os.getenv("SOLVE_POLL_INTERVAL", "3"))     # first gap between fallback polls
+SOLVE_MAX_POLL_INTERVAL = float(os.getenv("SOLVE_MAX_POLL_INTERVAL", "10"))
+SOLVE_POLL_CONCURRENCY = int(os.getenv("SOLVE_POLL_CONCURRENCY", "20"))  # getTaskResult calls in flight
+SOLVE_MAX_WAITERS = int(os.getenv("SOLVE_MAX_WAITERS", "10000"))
+
+SOLVE_RESULTS = Counter("solve_results_total", "How /solve tasks finished", ("source",))
+
+
+class SolverBusy(Exception):
+    pass
+
+
+@dataclass
+class Waiter:
+    token: str
+    client_key: str
+    future: asyncio.Future
+    started: float = field(default_factory=time.monotonic)
+    task_id: int | None = None
+    polls: int = 0
+    interval: float = SOLVE_POLL_INTERVAL
+
+
+class Solver:
+    """
+    createTask with a callbackUrl, then wait for CapMonster to push the result.
+
+    Every task gets a waiter keyed by a random token that is part of its
+    callback URL, so a callback is matched without a lookup by task id and
+    can't be forged without the token. The waiter is registered before
+    createTask is sent — a fast callback can't arrive to an empty table.
+    Tasks whose callback doesn't show up within SOLVE_CALLBACK_GRACE are
+    polled with getTaskResult from one heap and one scheduler loop, the same
+    shape as the bot's TaskRunner. Without SOLVE_PUBLIC_URL every task is polled.
+    """
+
+    def __init__(self, call, public_url: str = SOLVE_PUBLIC_URL, timeout: float = SOLVE_TIMEOUT,
+                 callback_grace: float = SOLVE_CALLBACK_GRACE, poll_interval: float = SOLVE_POLL_INTERVAL,
+                 max_poll_interval: float = SOLVE_MAX_POLL_INTERVAL,
+                 poll_concurrency: int = SOLVE_POLL_CONCURRENCY, max_waiters: int = SOLVE_MAX_WAITERS):
+        """
+        `call(method, payload, idempotent)` is a coroutine function that sends a
+        CapMonster request (CapMonsterClient.call).
+        """
+        self._call = call
+        self.public_url = public_url.rstrip("/")
+        self.timeout = timeout
+        self.callback_grace = callback_grace
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.max_waiters = max_waiters
+        self._semaphore = asyncio.Semaphore(poll_concurrency)
+        self._waiters: dict[str, Waiter] = {}
+        self._heap: list[tuple[float, int, Waiter]] = []
+        self._seq = itertools.count()
+        self._wakeup: asyncio.Event | None = None
+        self._loop_task: asyncio.Task | None = None
+        self._polls: set[asyncio.Task] = set()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _ensure_started(self):
+        if self._loop_task is None:
+            self._wakeup = asyncio.Event()
+            self._loop_task = asyncio.get_running_loop().create_task(self._scheduler())
+
+    def _schedule(self, waiter: Waiter, delay: float):
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), waiter))
+        self._wakeup.set()
+
+    def _finish(self, waiter: Waiter, result: dict, source: str):
+        if self._waiters.pop(waiter.token, None) is None or waiter.future.done():
+            return
+        SOLVE_RESULTS.inc(source)
+        waiter.future.set_result(result)
+
+    def register(self, client_key: str) -> Waiter:
+        """
+        Adds a waiter for a task that is about to be created. Send createTask with
+        `callback_url(waiter)`, then call `created()` (or `discard()` if it failed).
+        """
+        if len(self._waiters) >= self.max_waiters:
+            raise SolverBusy(f"Too many tasks waiting (max {self.max_waiters})")
+        self._ensure_started()
+        token = secrets.token_urlsafe(16)
+        waiter = Waiter(token, client_key, asyncio.get_running_loop().create_future(),
+                        interval=self.poll_interval)
+        self._waiters[token] = waiter
+        return waiter
+
+    def callback_url(self, waiter: Waiter) -> str | None:
+        return f"{self.public_url}/solve/callback/{waiter.token}" if self.public_url else None
+
+    def created(self, waiter: Waiter, task_id: int):
+        waiter.task_id = task_id
+        self._schedule(waiter, self.callback_grace if self.public_url else self.poll_interval)
+
+    def discard(self, waiter: Waiter):
+        self._waiters.pop(waiter.token, None)
+
+    async def submit(self, client_key: str, request: dict) -> Waiter:
+        """
+        Sends createTask. Returns the waiter once CapMonster has accepted the task;
+        await `wait(waiter)` for the getTaskResult-shaped result.
+        API errors from createTask are raised as CapMonsterAPIError.
+        """
+        waiter = self.register(client_key)
+        payload = dict(request, clientKey=client_key)
+        payload.pop("callbackUrl", None)
+        if self.public_url:
+            payload["callbackUrl"] = self.callback_url(waiter)
+        try:
+            result = await self._call("createTask", payload, False)
+        except BaseException:
+            self.discard(waiter)
+            raise
+        self.created(waiter, result["taskId"])
+        return waiter
+
+    async def wait(self, waiter: Waiter) -> dict:
+        """
+        The task's result, or {"errorId": 0, "status": "timeout"} after SOLVE_TIMEOUT.
+        A caller that goes away takes the waiter with it — nobody polls for it.
+        """
+        remaining = waiter.started + self.timeout - time.monotonic()
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter.future), timeout=max(0.0, remaining))
+        except asyncio.TimeoutError:
+            self._finish(waiter, {"errorId": 0, "status": "timeout"}, "timeout")
+            return waiter.future.result()
+        finally:
+            self._waiters.pop(waiter.token, None)
+
+    def callback(self, token: str, data: dict) -> bool:
+        """
+        A callback POST from CapMonster (same body as getTaskResult).
+        Returns False for unknown or already finished tokens.
+        """
+        waiter = self._waiters.get(token)
+        if waiter is None:
+            return False
+        if "taskId" in data and waiter.task_id is not None and str(data["taskId"]) != str(waiter.task_id):
+            logging.warning("Solve callback for task %s carried taskId %s", waiter.task_id, data["taskId"])
+            return False
+        if data.get("errorId", 0) == 0 and data.get("status") != "ready":
+            return True  # still processing — keep waiting
+        self._finish(waiter, data, "callback")
+        return True
+
+    async def _scheduler(self):
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, waiter = heapq.heappop(self._heap)
+            # answered by a callback (or abandoned) in the meantime
+            if waiter.future.done() or waiter.token not in self._waiters:
+                continue
+            poll = asyncio.create_task(self._poll(waiter))
+            self._polls.add(poll)
+            poll.add_done_callback(self._polls.discard)
+
+    async def _poll(self, waiter: Waiter):
+        waiter.polls += 1
+        try:
+            async with self._semaphore:
+                result = await self._call(
+                    "getTaskResult", {"clientKey": waiter.client_key, "taskId": waiter.task_id}, True,
+                )
+        except CapMonsterAPIError as e:
+            self._finish(waiter, e.response, "poll")
+            return
+        except Exception as e:
+            result = None
+            logging.warning("getTaskResult failed for task %s: %s", waiter.task_id, e)
+
+        if result is not None and result.get("status") == "ready":
+            self._finish(waiter, result, "poll")
+            return
+        if waiter.token in self._waiters:
+            delay = waiter.interval
+            waiter.interval = min(waiter.interval * 1.5, self.max_poll_interval)
+            self._schedule(waiter, delay)
+
+    async def close(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+        for poll in list(self._polls):
+            poll.cancel()
+        for waiter in self._waiters.values():
+            if not waiter.future.done():
+                waiter.future.cancel()
+        self._waiters.clear()
+
+
+def track_solver(solver: Solver):
+    Gauge("solve_waiting", "/solve tasks waiting for a result", collect=lambda: {(): solver.waiting})
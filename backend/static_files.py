@@ -0,0 +1,93 @@
+import hashlib
+import os
+import re
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import FileResponse
+
+# -------------------------------
+# Optional static file serving for frontend/dist (override via .env)
+# -------------------------------
+SERVE_STATIC = os.getenv("SERVE_STATIC", "0") == "1"
+STATIC_DIR = os.getenv("STATIC_DIR", os.path.join(os.path.dirname(__file__), "..", "frontend", "dist"))
+
+# name.<10 hex chars>.ext — written by frontend/build_assets.py, never changes in place
+HASHED_NAME = re.compile(r"\.([0-9a-f]{10})\.[A-Za-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+MEDIA_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".json": "application/json",
+    ".webp": "image/webp",
+    ".gif": "image/gif",
+    ".png": "image/png",
+    ".mp4": "video/mp4",
+}
+# Accept-Encoding token -> suffix of the precompressed file, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+class StaticFiles:
+    """
+    Serves the built frontend. Content-hashed files are cached forever,
+    everything else (index.html, prices.json, manifest.json) is revalidated
+    by ETag. Precompressed .br / .gz siblings are picked by Accept-Encoding;
+    each encoding is a different representation, so it gets its own ETag.
+    """
+
+    def __init__(self, directory: str = STATIC_DIR):
+        self.directory = os.path.realpath(directory)
+        # path -> (mtime, size, etag)
+        self._etags: dict[str, tuple[float, int, str]] = {}
+
+    def _resolve(self, path: str) -> str:
+        full = os.path.realpath(os.path.join(self.directory, path or "index.html"))
+        if os.path.commonpath([full, self.directory]) != self.directory or not os.path.isfile(full):
+            raise HTTPException(status_code=404, detail="Not found")
+        return full
+
+    def _etag(self, full: str) -> str:
+        match = HASHED_NAME.search(full)
+        if match:
+            return f'"{match.group(1)}"'
+        st = os.stat(full)
+        cached = self._etags.get(full)
+        if cached and cached[:2] == (st.st_mtime, st.st_size):
+            return cached[2]
+        with open(full, "rb") as f:
+            etag = f'"{hashlib.sha256(f.read()).hexdigest()[:16]}"'
+        self._etags[full] = (st.st_mtime, st.st_size, etag)
+        return etag
+
+    def response(self, path: str, request: Request) -> Response:
+        full = self._resolve(path)
+        accepted = {token.split(";")[0].strip() for token in request.headers.get("accept-encoding", "").split(",")}
+        encoding, suffix = next(
+            ((token, ext) for token, ext in ENCODINGS if token in accepted and os.path.isfile(full + ext)),
+            (None, ""),
+        )
+
+        etag = self._etag(full)
+        if encoding is not None:
+            etag = f'{etag[:-1]}-{suffix[1:]}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE if HASHED_NAME.search(full) else REVALIDATE,
+            "Vary": "Accept-Encoding",
+        }
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return FileResponse(full + suffix, media_type=MEDIA_TYPES.get(os.path.splitext(full)[1]), headers=headers)
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    If-None-Match is "*" or a comma-separated list of tags, compared weakly
+    (RFC 9110 §13.1.2): a W/ prefix on either side doesn't matter.
+    """
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
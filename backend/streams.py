@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from cache import hash_key
+from metrics import Gauge
+
+# -------------------------------
+# Live balance stream settings (override via .env)
+# -------------------------------
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", "15"))
+STREAM_HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", "20"))
+
+
+class _Topic:
+    def __init__(self):
+        self.subscribers: set[asyncio.Queue] = set()
+        self.last: dict | None = None
+        self.task: asyncio.Task | None = None
+
+
+def _offer(queue: asyncio.Queue, data: dict):
+    # latest value wins — a slow client never builds up a backlog
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(data)
+
+
+class BalanceHub:
+    """
+    One upstream poller per distinct key, shared by all of its subscribers.
+    Updates are pushed only when the value changes, and the poller stops
+    when the last subscriber leaves.
+    """
+
+    def __init__(self, fetch, interval: float = STREAM_POLL_INTERVAL):
+        """
+        `fetch(clientKey)` is a coroutine function returning the getBalance response.
+        """
+        self._fetch = fetch
+        self.interval = interval
+        self._topics: dict[str, _Topic] = {}
+
+    @property
+    def pollers(self) -> int:
+        return len(self._topics)
+
+    @property
+    def subscribers(self) -> int:
+        return sum(len(t.subscribers) for t in self._topics.values())
+
+    @asynccontextmanager
+    async def subscribe(self, clientKey: str):
+        key = hash_key(clientKey)
+        topic = self._topics.get(key)
+        if topic is None:
+            topic = self._topics[key] = _Topic()
+            topic.task = asyncio.create_task(self._poll(clientKey, topic))
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        if topic.last is not None:
+            queue.put_nowait(topic.last)
+        topic.subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            topic.subscribers.discard(queue)
+            if not topic.subscribers:
+                topic.task.cancel()
+                if self._topics.get(key) is topic:
+                    del self._topics[key]
+
+    async def _poll(self, clientKey: str, topic: _Topic):
+        while True:
+            try:
+                data = await self._fetch(clientKey)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning("Balance stream poll failed: %s", e)
+                data = {"error": "Connection error"}
+            if data != topic.last:
+                topic.last = data
+                for queue in topic.subscribers:
+                    _offer(queue, data)
+            await asyncio.sleep(self.interval)
+
+    async def close(self):
+        for topic in list(self._topics.values()):
+            topic.task.cancel()
+        self._topics.clear()
+
+
+def track_hub(hub: BalanceHub):
+    Gauge("balance_stream_subscribers", "Open balance streams", collect=lambda: {(): hub.subscribers})
+    Gauge("balance_stream_pollers", "Keys polled upstream for balance streams", collect=lambda: {(): hub.pollers})
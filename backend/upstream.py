@@ -0,0 +1,51 @@
+import os
+import aiohttp
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import repo_root  # noqa: F401,E402 — shared packages at the repository root
+from capmonster_client import CapMonsterClient  # noqa: E402
+from metrics import record_decode, track_pool, upstream_trace_config  # noqa: E402
+
+# -------------------------------
+# Upstream connection pool settings (override via .env)
+# -------------------------------
+CAPMONSTER_API = os.getenv("CAPMONSTER_API", "https://api.capmonster.cloud")
+
+POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "100"))
+POOL_SIZE_PER_HOST = int(os.getenv("UPSTREAM_POOL_SIZE_PER_HOST", "0"))  # 0 = no per-host limit
+KEEPALIVE_TIMEOUT = float(os.getenv("UPSTREAM_KEEPALIVE_TIMEOUT", "30"))
+DNS_CACHE_TTL = int(os.getenv("UPSTREAM_DNS_CACHE_TTL", "300"))
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "15"))
+RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))  # idempotent calls only
+
+
+def create_session() -> aiohttp.ClientSession:
+    """
+    Builds the shared session used for every call to CapMonster.
+    Connections are kept alive and DNS lookups are cached, so only the
+    first request pays for the TCP + TLS handshake.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=POOL_SIZE,
+        limit_per_host=POOL_SIZE_PER_HOST,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        use_dns_cache=True,
+        ttl_dns_cache=DNS_CACHE_TTL,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=None,
+        sock_connect=CONNECT_TIMEOUT,
+        sock_read=READ_TIMEOUT,
+    )
+    track_pool(connector)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[upstream_trace_config()])
+
+
+def create_client(session: aiohttp.ClientSession) -> CapMonsterClient:
+    """
+    The client borrows `session`; whoever created the session closes it.
+    """
+    return CapMonsterClient(CAPMONSTER_API, session=session, retries=RETRIES, on_decode=record_decode)
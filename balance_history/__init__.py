@@ -0,0 +1,11 @@
+from .store import RECORD, WINDOWS, BalanceHistory, KeyHistory, Ring, describe, key_digest
+
+__all__ = [
+    "RECORD",
+    "WINDOWS",
+    "BalanceHistory",
+    "KeyHistory",
+    "Ring",
+    "describe",
+    "key_digest",
+]
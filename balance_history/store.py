@@ -0,0 +1,368 @@
+import asyncio
+import fcntl
+import hashlib
+import logging
+import os
+import struct
+import time
+from array import array
+from collections import OrderedDict, deque
+
+# -------------------------------
+# Balance history settings (override via .env)
+# -------------------------------
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_PATH = os.getenv("BALANCE_HISTORY_PATH", os.path.join(PACKAGE_DIR, "balance_history.bin"))  # empty = memory only
+HISTORY_MAX_KEYS = int(os.getenv("BALANCE_HISTORY_MAX_KEYS", "5000"))          # least recently used keys are dropped
+HISTORY_SYNC_INTERVAL = float(os.getenv("BALANCE_HISTORY_SYNC_INTERVAL", "5"))  # seconds between reads of other processes' samples
+HISTORY_COMPACT_INTERVAL = float(os.getenv("BALANCE_HISTORY_COMPACT_INTERVAL", "3600"))
+
+# two resolutions per key: recent samples at least 30 s apart (3 h of them),
+# and one sample per 15 min for a week — 16 bytes each, ~16 KB per key at most
+FINE_SPACING, FINE_SAMPLES = 30.0, 360
+COARSE_SPACING, COARSE_SAMPLES = 900.0, 672
+
+WINDOWS = {"1h": 3600, "24h": 86400, "7d": 7 * 86400}
+MIN_SPAN = 300  # seconds of samples needed before a window has a rate
+
+# sha256 of the key, unix time, balance
+RECORD = struct.Struct("<32sdd")
+READ_CHUNK = RECORD.size * 4096
+MAX_UNWRITTEN = 10000
+
+
+def key_digest(client_key: str) -> bytes:
+    return hashlib.sha256(client_key.encode()).digest()
+
+
+class Ring:
+    """
+    Fixed-capacity ring of (time, balance) kept in two flat arrays of doubles.
+    """
+
+    __slots__ = ("times", "values", "start", "capacity")
+
+    def __init__(self, capacity: int):
+        self.times = array("d")
+        self.values = array("d")
+        self.start = 0
+        self.capacity = capacity
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, t: float, value: float):
+        if len(self.times) < self.capacity:
+            self.times.append(t)
+            self.values.append(value)
+        else:
+            self.times[self.start] = t
+            self.values[self.start] = value
+            self.start = (self.start + 1) % self.capacity
+
+    def last_time(self) -> float | None:
+        return self.times[self.start - 1] if self.times else None
+
+    def oldest_time(self) -> float | None:
+        return self.times[self.start] if self.times else None
+
+    def newest_first(self):
+        n = len(self.times)
+        for i in range(n):
+            j = (self.start - 1 - i) % n
+            yield self.times[j], self.values[j]
+
+
+class KeyHistory:
+    __slots__ = ("fine", "coarse")
+
+    def __init__(self):
+        self.fine = Ring(FINE_SAMPLES)
+        self.coarse = Ring(COARSE_SAMPLES)
+
+    def add(self, t: float, value: float) -> bool:
+        """
+        False when the sample is too close to the previous one to be kept.
+        """
+        last = self.fine.last_time()
+        if last is not None and t - last < FINE_SPACING:
+            return False
+        self.fine.append(t, value)
+        last = self.coarse.last_time()
+        if last is None or t - last >= COARSE_SPACING:
+            self.coarse.append(t, value)
+        return True
+
+    def samples(self) -> list[tuple[float, float]]:
+        merged = dict(self.coarse.newest_first())
+        merged.update(self.fine.newest_first())
+        return sorted(merged.items())
+
+    def window(self, now: float, seconds: float) -> dict | None:
+        """
+        Spend over the last `seconds`: only the samples inside the window are
+        visited, newest first, from the finest ring that reaches back far enough.
+        Top-ups are left out of the spend and reported separately.
+        """
+        since = now - seconds
+        oldest = self.fine.oldest_time()
+        ring = self.fine if oldest is not None and oldest <= since else self.coarse
+        if len(ring) < 2 and len(self.fine) >= 2:
+            ring = self.fine
+
+        spent = topped_up = 0.0
+        count = 0
+        first = newer = None
+        for t, value in ring.newest_first():
+            if t < since:
+                break
+            if newer is None:
+                first = t
+            else:
+                change = value - newer
+                if change > 0:
+                    spent += change
+                else:
+                    topped_up -= change
+            newer = value
+            last = t
+            count += 1
+        if count < 2 or first - last < MIN_SPAN:
+            return None
+        span = first - last
+        return {"spent": round(spent, 6), "toppedUp": round(topped_up, 6), "span": round(span),
+                "samples": count, "perDay": round(spent / span * 86400, 6)}
+
+
+class BalanceHistory:
+    """
+    getBalance samples per key (by SHA-256 digest — keys themselves are never
+    stored), in bounded rings in memory and in an append-only file of fixed-size
+    records that several processes (webhook workers, the backend) can share.
+
+    Each record goes to the file with one write() on an O_APPEND descriptor
+    under a shared flock, so writers never interleave inside a record. Every
+    process reads what the others append every sync interval, so /spend sees
+    the same history whichever worker answers. Once the file holds more than
+    twice what the rings keep, one process rewrites it from its rings under an
+    exclusive flock; the others notice the old file was replaced and reopen.
+    """
+
+    def __init__(self, path: str = HISTORY_PATH, max_keys: int = HISTORY_MAX_KEYS,
+                 sync_interval: float = HISTORY_SYNC_INTERVAL,
+                 compact_interval: float = HISTORY_COMPACT_INTERVAL):
+        self.path = path
+        self.max_keys = max_keys
+        self.sync_interval = sync_interval
+        self.compact_interval = compact_interval
+        self._keys: OrderedDict[bytes, KeyHistory] = OrderedDict()
+        self._fd: int | None = None
+        self._offset = 0  # bytes of the file already taken into the rings
+        # records waiting for the file lock (a compaction is running) — retried every sync
+        self._unwritten: deque[bytes] = deque(maxlen=MAX_UNWRITTEN)
+        self._task: asyncio.Task | None = None
+
+    @property
+    def keys(self) -> int:
+        return len(self._keys)
+
+    @property
+    def samples(self) -> int:
+        return sum(len(h.fine) + len(h.coarse) for h in self._keys.values())
+
+    def _history(self, digest: bytes) -> KeyHistory:
+        history = self._keys.get(digest)
+        if history is None:
+            history = self._keys[digest] = KeyHistory()
+            if len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(digest)
+        return history
+
+    def _apply(self, data: bytes) -> int:
+        """
+        Adds whole records to the rings. Returns how many were kept.
+        """
+        kept = 0
+        for digest, t, value in RECORD.iter_unpack(data):
+            kept += self._history(digest).add(t, value)
+        return kept
+
+    def _open(self) -> int:
+        """
+        Opens the current file. A torn record at the end (a crash mid-write) is
+        cut off under an exclusive lock, so later appends stay aligned.
+        """
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                st = os.fstat(fd)
+                if st.st_nlink:
+                    if st.st_size % RECORD.size:
+                        os.ftruncate(fd, st.st_size - st.st_size % RECORD.size)
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                    return fd
+            except BaseException:
+                os.close(fd)
+                raise
+            os.close(fd)  # replaced by a compaction while we waited for the lock
+
+    async def _catch_up(self):
+        """
+        Takes in records appended since the last call, by this or any other
+        process. If another process has compacted the file, the old one is read
+        to its end and the new one from the start (already known samples are
+        dropped by the ring spacing).
+        """
+        kept = 0
+        while True:
+            data = await asyncio.to_thread(os.pread, self._fd, READ_CHUNK, self._offset)
+            usable = len(data) - len(data) % RECORD.size
+            kept += self._apply(data[:usable])
+            self._offset += usable
+            if len(data) == READ_CHUNK:
+                continue
+            if os.fstat(self._fd).st_nlink:
+                break
+            fd = await asyncio.to_thread(self._open)
+            os.close(self._fd)
+            self._fd, self._offset = fd, 0
+        return kept
+
+    def _write(self):
+        if self._fd is None or not self._unwritten:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return  # being compacted; the next sync retries
+        try:
+            if os.fstat(self._fd).st_nlink == 0:
+                return  # replaced by a compaction; the next sync reopens it
+            while self._unwritten:
+                os.write(self._fd, self._unwritten[0])
+                self._unwritten.popleft()
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def record(self, client_key: str, balance: float, t: float | None = None):
+        t = time.time() if t is None else t
+        digest = key_digest(client_key)
+        if not self._history(digest).add(t, float(balance)) or self._fd is None:
+            return
+        self._unwritten.append(RECORD.pack(digest, t, float(balance)))
+        try:
+            self._write()
+        except OSError as e:
+            logging.warning("Balance history write failed: %s", e)
+
+    def summary(self, client_key: str, now: float | None = None) -> dict | None:
+        history = self._keys.get(key_digest(client_key))
+        if history is None or not len(history.fine):
+            return None
+        now = time.time() if now is None else now
+        at, balance = next(history.fine.newest_first())
+        windows = {name: history.window(now, seconds) for name, seconds in WINDOWS.items()}
+        # one day of data is the steadiest guide; fall back to whatever there is
+        basis = next((name for name in ("24h", "7d", "1h") if windows[name] and windows[name]["perDay"] > 0), None)
+        days_left = balance / windows[basis]["perDay"] if basis else None
+        return {
+            "balance": balance, "at": at, "windows": windows, "basis": basis,
+            "daysLeft": round(days_left, 2) if days_left is not None else None,
+            "text": describe(days_left, basis, any(windows.values())),
+        }
+
+    async def start(self):
+        if self.path and self._fd is None:
+            self._fd = await asyncio.to_thread(self._open)
+            kept = await self._catch_up()
+            logging.info("Balance history: %s samples of %s keys loaded from %s", kept, len(self._keys), self.path)
+        if self._task is None:
+            self._task = asyncio.create_task(self._maintain())
+
+    async def _maintain(self):
+        last_compact = time.monotonic()
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            if self._fd is None:
+                continue
+            try:
+                await self._catch_up()
+                self._write()
+                if time.monotonic() - last_compact >= self.compact_interval:
+                    last_compact = time.monotonic()
+                    if os.fstat(self._fd).st_size // RECORD.size > 2 * self.samples:
+                        await self.compact()
+            except OSError as e:
+                logging.warning("Balance history sync failed: %s", e)
+
+    async def compact(self) -> bool:
+        """
+        Rewrites the file from the rings and renames it over the old one, holding
+        an exclusive lock on the old file throughout: writers queue their records
+        meanwhile and append them to the new file. Returns False if another
+        process is compacting right now.
+        """
+        if self._fd is None:
+            return False
+        lock_fd = os.open(self.path, os.O_RDONLY)
+        try:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            if not os.path.samestat(os.fstat(lock_fd), os.fstat(self._fd)):
+                return False  # replaced just now; the next sync reopens it
+            # nobody can append now — take in everything up to the end first
+            await self._catch_up()
+            snapshot = [(digest, history.samples()) for digest, history in self._keys.items()]
+            tmp = f"{self.path}.tmp"
+            written = await asyncio.to_thread(_write_snapshot, tmp, snapshot)
+            os.replace(tmp, self.path)
+            fd = await asyncio.to_thread(self._open)
+            os.close(self._fd)
+            self._fd, self._offset = fd, written * RECORD.size
+        finally:
+            os.close(lock_fd)
+        self._write()
+        logging.info("Balance history compacted to %s records", written)
+        return True
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._fd is not None:
+            try:
+                self._write()
+            except OSError as e:
+                logging.warning("Balance history write failed: %s", e)
+            os.close(self._fd)
+            self._fd = None
+
+
+def _write_snapshot(path: str, snapshot) -> int:
+    count = 0
+    with open(path, "wb") as f:
+        for digest, samples in snapshot:
+            f.write(b"".join(RECORD.pack(digest, t, value) for t, value in samples))
+            count += len(samples)
+        f.flush()
+        os.fsync(f.fileno())
+    return count
+
+
+def describe(days_left: float | None, basis: str | None, has_windows: bool = True) -> str:
+    if not has_windows:
+        return "Not enough history yet to estimate spending."
+    if basis is None:
+        return "No spending seen lately."
+    if days_left < 1:
+        left = f"~{days_left * 24:.1f} hours"
+    elif days_left > 365:
+        left = "more than a year"
+    else:
+        left = f"~{days_left:.1f} days"
+    return f"At the {basis} rate, {left} left."
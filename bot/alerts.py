@@ -0,0 +1,217 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass
+
+import repo_root  # noqa: F401 — shared packages at the repository root
+from capmonster_client import CapMonsterAPIError, CapMonsterClient, KeyDoesNotExistError
+
+# -------------------------------
+# Low-balance alert settings (override via .env)
+# -------------------------------
+# polling is one process by nature; webhook workers each opt in, so only one sends alerts
+ALERTS_ENABLED = os.getenv("ALERTS_ENABLED", "1" if os.getenv("BOT_MODE", "polling") == "polling" else "0") == "1"
+ALERT_INTERVAL = float(os.getenv("ALERT_INTERVAL", "300"))         # seconds between checks of a moving balance
+ALERT_MAX_INTERVAL = float(os.getenv("ALERT_MAX_INTERVAL", "3600"))  # ceiling for balances that sit still
+ALERT_CONCURRENCY = int(os.getenv("ALERT_CONCURRENCY", "10"))      # getBalance calls in flight
+ALERT_MAX_RATE = float(os.getenv("ALERT_MAX_RATE", "20"))          # getBalance calls per second, at most
+ALERT_REFRESH = float(os.getenv("ALERT_REFRESH", "300"))           # seconds between key store re-reads
+ALERT_REARM = float(os.getenv("ALERT_REARM", "0.1"))               # re-arm once 10% above the threshold
+JITTER = 0.2                                                       # ±20% on every interval
+STABLE_CHANGE = 0.001                                              # USD; smaller moves count as "no change"
+
+
+@dataclass
+class Watch:
+    user_id: int
+    client_key: str
+    threshold: float
+    alerted: bool
+    interval: float = ALERT_INTERVAL
+    balance: float | None = None
+    active: bool = True
+
+
+class BalanceAlerts:
+    """
+    Checks the balance of every key with an alert threshold and messages the
+    user once when it drops below it.
+
+    Same shape as TaskRunner: one heap of (due time, watch) and a single
+    scheduler loop. First checks are spread over a whole interval and every
+    interval is jittered, so keys never line up into bursts; launches are paced
+    to ALERT_MAX_RATE and capped at ALERT_CONCURRENCY. A balance that does not
+    move is checked less and less often (up to ALERT_MAX_INTERVAL). The
+    "already alerted" flag is kept in the key store, so restarts don't repeat
+    alerts; it re-arms once the balance is topped up past the threshold.
+    """
+
+    def __init__(self, client: CapMonsterClient, key_store, send, interval: float = ALERT_INTERVAL,
+                 max_interval: float = ALERT_MAX_INTERVAL, concurrency: int = ALERT_CONCURRENCY,
+                 max_rate: float = ALERT_MAX_RATE, refresh: float = ALERT_REFRESH, history=None):
+        """
+        `send(user_id, text)` is a coroutine function delivering the alert.
+        Every balance read is also recorded in `history` (a BalanceHistory), if given.
+        """
+        self.client = client
+        self.history = history
+        self.key_store = key_store
+        self.send = send
+        self.interval = interval
+        self.max_interval = max_interval
+        self.refresh = refresh
+        self._spacing = 1 / max_rate
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._watches: dict[int, Watch] = {}
+        self._heap: list[tuple[float, int, Watch]] = []
+        self._seq = itertools.count()
+        self._wakeup: asyncio.Event | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._checks: set[asyncio.Task] = set()
+        self.sent = 0
+
+    @property
+    def watched(self) -> int:
+        return len(self._watches)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def _jittered(self, interval: float) -> float:
+        return interval * random.uniform(1 - JITTER, 1 + JITTER)
+
+    def _schedule(self, watch: Watch, delay: float):
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), watch))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def watch(self, user_id: int, client_key: str, threshold: float, alerted: bool = False, spread: bool = True):
+        """
+        Starts (or restarts) checks for a user. With `spread` the first check lands
+        anywhere within one interval; otherwise it happens right away. On a worker
+        that doesn't run the checks (ALERTS_ENABLED=0) this does nothing: the
+        threshold is in the key store, and the alerting worker's reload picks it up.
+        """
+        if not self.running:
+            return
+        previous = self._watches.get(user_id)
+        if previous is not None and (previous.client_key, previous.threshold) == (client_key, threshold):
+            previous.alerted = alerted
+            return
+        if previous is not None:
+            previous.active = False
+        watch = self._watches[user_id] = Watch(user_id, client_key, threshold, alerted, interval=self.interval)
+        self._schedule(watch, random.uniform(0, self.interval) if spread else 0)
+
+    def update_key(self, user_id: int, client_key: str):
+        watch = self._watches.get(user_id)
+        if watch is not None and watch.client_key != client_key:
+            self.watch(user_id, client_key, watch.threshold, spread=False)
+
+    def unwatch(self, user_id: int):
+        # its heap entry stays behind and is skipped once due
+        watch = self._watches.pop(user_id, None)
+        if watch is not None:
+            watch.active = False
+
+    async def reload(self):
+        subscriptions = await self.key_store.alert_subscriptions()
+        seen = set()
+        for user_id, client_key, threshold, alerted in subscriptions:
+            seen.add(user_id)
+            self.watch(user_id, client_key, threshold, alerted)
+        for user_id in list(self._watches):
+            if user_id not in seen:
+                self.unwatch(user_id)
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._scheduler()), asyncio.create_task(self._reloader())]
+
+    async def _reloader(self):
+        while True:
+            try:
+                await self.reload()
+            except Exception:
+                logging.exception("Reloading balance alerts failed")
+            await asyncio.sleep(self._jittered(self.refresh))
+
+    async def _scheduler(self):
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, watch = heapq.heappop(self._heap)
+            if not watch.active:
+                continue
+            # backpressure: a slow upstream holds the loop here instead of piling up tasks
+            await self._semaphore.acquire()
+            check = asyncio.create_task(self._check(watch))
+            self._checks.add(check)
+            check.add_done_callback(self._checks.discard)
+            await asyncio.sleep(self._spacing)
+
+    async def _check(self, watch: Watch):
+        try:
+            balance = await self.client.get_balance(watch.client_key)
+        except KeyDoesNotExistError:
+            balance = None
+            watch.interval = self.max_interval
+        except CapMonsterAPIError as e:
+            balance = None
+            logging.info("Balance alert check for user %s failed: %s", watch.user_id, e.code)
+        except Exception as e:
+            balance = None
+            logging.warning("Balance alert check for user %s failed: %s", watch.user_id, e)
+        finally:
+            self._semaphore.release()
+
+        if balance is not None:
+            if self.history is not None:
+                self.history.record(watch.client_key, balance)
+            try:
+                await self._evaluate(watch, balance)
+            except Exception:
+                logging.exception("Balance alert for user %s failed", watch.user_id)
+        if watch.active:
+            self._schedule(watch, self._jittered(watch.interval))
+
+    async def _evaluate(self, watch: Watch, balance: float):
+        previous, watch.balance = watch.balance, balance
+        if previous is not None and abs(balance - previous) < STABLE_CHANGE:
+            watch.interval = min(watch.interval * 1.5, self.max_interval)
+        else:
+            watch.interval = self.interval
+        if balance < watch.threshold * (1 + ALERT_REARM):
+            # close to the line: don't let backoff make us late
+            watch.interval = min(watch.interval, self.interval)
+
+        if not watch.alerted and balance < watch.threshold:
+            await self.send(watch.user_id, f"🔔 *Low balance:* ${balance:.3f} — below your ${watch.threshold:g} alert.")
+            watch.alerted = True
+            self.sent += 1
+            await self.key_store.set_alerted(watch.user_id, True)
+        elif watch.alerted and balance >= watch.threshold * (1 + ALERT_REARM):
+            watch.alerted = False
+            await self.key_store.set_alerted(watch.user_id, False)
+
+    async def close(self):
+        for task in self._tasks + list(self._checks):
+            task.cancel()
+        self._tasks = []
+        self._watches.clear()
+        self._heap.clear()
@@ -0,0 +1,86 @@
+"""
+Micro-benchmark: per-callback handler time with the old per-tap rendering
+(new keyboard + json.dumps on every call) vs the pre-rendered lookup tables.
+
+Telegram is not contacted — message.answer / edit_text are no-op stubs.
+Demo media is switched off: the old handlers sent text only, and the stubs
+have no answer_animation / answer_photo to send it with.
+
+    cd bot
+    python bench_handlers.py --rounds 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK-TOKEN-not-used-for-requests")
+os.environ["DEMO_MEDIA"] = "0"
+
+import bot  # noqa: E402
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton  # noqa: E402
+
+
+async def _noop(*args, **kwargs):
+    return None
+
+
+def fake_call(data: str):
+    message = SimpleNamespace(answer=_noop, edit_text=_noop)
+    return SimpleNamespace(data=data, message=message, answer=_noop, from_user=SimpleNamespace(id=1))
+
+
+# --- the handlers as they were before pre-rendering ---
+async def old_show_captcha_example(call):
+    example = bot.catalog.current.examples[call.data]
+    text = (
+        f"🧩 *{example['type']}*\n\n"
+        f"📍 *Method URL:*\n`https://api.capmonster.cloud/createTask`\n"
+        f"📤 *Request format:* JSON POST\n\n"
+        f"💡 *Example request:*\n```json\n{json.dumps(example['request'], indent=2)}\n```\n\n"
+        f"📥 *Example response:*\n```json\n{json.dumps(example['response'], indent=2)}\n```"
+    )
+    await call.message.answer(text)
+
+
+async def old_more5(call):
+    kb = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🛍️ Temu", callback_data="test_temu")],
+        [InlineKeyboardButton(text="🐼 Yidun", callback_data="test_yidun")],
+        [InlineKeyboardButton(text="🔐 MTCaptcha", callback_data="test_mtcaptcha")],
+        [InlineKeyboardButton(text="🧊 Altcha", callback_data="test_altcha")],
+        [InlineKeyboardButton(text="⬅️ Back", callback_data="test_more4")]
+    ])
+    await call.message.edit_text("📚 *More captcha types — Level 5*", reply_markup=kb)
+
+
+async def measure(handler, data: str, rounds: int) -> float:
+    call = fake_call(data)
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        await handler(call)
+    return (time.perf_counter() - t0) / rounds * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+
+    cases = [
+        ("example test_temu", old_show_captcha_example, bot.show_captcha_example, "test_temu"),
+        ("example test_imperva", old_show_captcha_example, bot.show_captcha_example, "test_imperva"),
+        ("menu test_more5", old_more5, bot.more_menu, "test_more5"),
+    ]
+    print(f"{'callback':<22} {'before µs':>10} {'after µs':>10} {'speedup':>8}")
+    for name, before, after, data in cases:
+        b = await measure(before, data, args.rounds)
+        a = await measure(after, data, args.rounds)
+        print(f"{name:<22} {b:>10.2f} {a:>10.2f} {b / a:>7.1f}x")
+    await bot.bot.session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
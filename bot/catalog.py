@@ -0,0 +1,298 @@
+"""
+The captcha type catalog (catalog.json at the repository root) and everything
+the bot renders from it: example messages, "Run it live" keyboards, the
+paginated "More..." menus, the inline search index and the demo media.
+
+    # regenerate frontend/prices.json after editing the catalog
+    python bot/catalog.py export-prices
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+from dataclasses import dataclass, replace
+from types import MappingProxyType
+
+from aiogram.enums import ParseMode
+from aiogram.types import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+)
+
+from search import SearchIndex
+
+# -------------------------------
+# Catalog settings (override via .env)
+# -------------------------------
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CATALOG_PATH = os.getenv("CATALOG_PATH", os.path.join(ROOT, "catalog.json"))
+CATALOG_POLL_INTERVAL = float(os.getenv("CATALOG_POLL_INTERVAL", "2"))  # seconds between file checks
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "3"))           # types per menu page
+MEDIA_DIR = os.getenv("MEDIA_DIR", os.path.join(ROOT, "frontend"))      # catalog "gif" paths are relative to it
+
+TYPES_MENU = "menu_test"
+TYPES_TEXT = "🧩 *Captcha types* — explore supported captcha categories."
+REQUIRED_FIELDS = ("id", "label", "type", "request", "response")
+USER_AGENT_PLACEHOLDER = "userAgentPlaceholder"
+MEDIA_KINDS = {".gif": "animation", ".mp4": "animation", ".png": "photo", ".jpg": "photo", ".jpeg": "photo"}
+
+
+@dataclass(frozen=True)
+class Media:
+    path: str
+    kind: str      # "animation", "photo" or "document"
+    digest: str    # sha256 of the content — the key of the Telegram file_id cache
+    version: tuple
+
+
+def load_media(media_dir: str, rel_path: str) -> Media | None:
+    path = os.path.join(media_dir, rel_path)
+    try:
+        version = _file_version(path)
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+    except OSError as e:
+        logging.warning("Demo media %s is not available: %s", rel_path, e)
+        return None
+    kind = MEDIA_KINDS.get(os.path.splitext(path)[1].lower(), "document")
+    return Media(path, kind, digest, version)
+
+
+def fill_user_agent(value, user_agent: str):
+    """
+    A copy of `value` with every "userAgentPlaceholder" string replaced.
+    """
+    if isinstance(value, dict):
+        return {k: fill_user_agent(v, user_agent) for k, v in value.items()}
+    if isinstance(value, list):
+        return [fill_user_agent(v, user_agent) for v in value]
+    return user_agent if value == USER_AGENT_PLACEHOLDER else value
+
+
+def render_captcha_example(entry: dict) -> str:
+    return (
+        f"🧩 *{entry['type']}*\n\n"
+        f"📍 *Method URL:*\n`https://api.capmonster.cloud/createTask`\n"
+        f"📤 *Request format:* JSON POST\n\n"
+        f"💡 *Example request:*\n```json\n{json.dumps(entry['request'], indent=2)}\n```\n\n"
+        f"📥 *Example response:*\n```json\n{json.dumps(entry['response'], indent=2)}\n```"
+    )
+
+
+def per_1000(price: float) -> str:
+    return f"${price * 1000:g} per 1000"
+
+
+def inline_article(result_id: str, title: str, description: str, text: str, docs: str | None = None):
+    kb = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="📖 Docs", url=docs)]]) if docs else None
+    return InlineQueryResultArticle(
+        id=result_id, title=title, description=description, reply_markup=kb,
+        input_message_content=InputTextMessageContent(message_text=text, parse_mode=ParseMode.MARKDOWN),
+    )
+
+
+def build_menus(entries: list[dict], page_size: int) -> dict:
+    """
+    menu_test is the first page, test_more1..N follow. A last page of
+    page_size + 1 types is kept whole rather than leaving one type alone.
+    """
+    pages = []
+    rest = entries
+    while rest:
+        take = len(rest) if len(rest) <= page_size + 1 and pages else page_size
+        pages.append(rest[:take])
+        rest = rest[take:]
+
+    menus = {}
+    for n, page in enumerate(pages):
+        callback = TYPES_MENU if n == 0 else f"test_more{n}"
+        rows = [[InlineKeyboardButton(text=e["label"], callback_data=f"test_{e['id']}")] for e in page]
+        if n + 1 < len(pages):
+            rows.append([InlineKeyboardButton(text="➕ More...", callback_data=f"test_more{n + 1}")])
+        back = "back_start" if n == 0 else (TYPES_MENU if n == 1 else f"test_more{n - 1}")
+        rows.append([InlineKeyboardButton(text="⬅️ Back", callback_data=back)])
+        text = TYPES_TEXT if n == 0 else f"📚 *More captcha types — Level {n}*"
+        menus[callback] = (text, InlineKeyboardMarkup(inline_keyboard=rows))
+    return menus
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """
+    Everything rendered from one version of the catalog. Handlers read
+    `catalog.current` once and use that snapshot to the end, so a reload
+    in the middle of a handler can't mix two versions.
+    """
+    entries: tuple
+    examples: MappingProxyType   # test_<id> -> catalog entry
+    messages: MappingProxyType   # test_<id> -> example text
+    run_kbs: MappingProxyType    # test_<id> -> "Run it live" keyboard
+    menus: MappingProxyType      # menu_test / test_moreN -> (text, keyboard)
+    index: SearchIndex
+    media: MappingProxyType      # test_<id> -> Media
+    version: tuple = ()
+
+    def media_changed(self) -> bool:
+        for media in self.media.values():
+            try:
+                if _file_version(media.path) != media.version:
+                    return True
+            except OSError:
+                return True
+        return False
+
+
+def build_snapshot(data: dict, extra_documents=(), page_size: int = CATALOG_PAGE_SIZE,
+                   version: tuple = (), media_dir: str = MEDIA_DIR, user_agent: str | None = None) -> CatalogSnapshot:
+    """
+    Validates and renders a parsed catalog. `extra_documents` are additional
+    (search text, inline result) pairs for the inline index (the endpoints).
+    With `user_agent`, it replaces the placeholder in requests and examples.
+    """
+    entries = data["types"]
+    seen = set()
+    for entry in entries:
+        missing = [f for f in REQUIRED_FIELDS if f not in entry]
+        if missing:
+            raise ValueError(f"catalog entry {entry.get('id', '?')} is missing {', '.join(missing)}")
+        if entry["id"] in seen or entry["id"].startswith("more"):
+            raise ValueError(f"catalog id {entry['id']} is duplicated or reserved")
+        solve_time = entry.get("solveTime", 1)
+        if isinstance(solve_time, bool) or not isinstance(solve_time, (int, float)) or solve_time <= 0:
+            raise ValueError(f"catalog entry {entry['id']} has an invalid solveTime")
+        seen.add(entry["id"])
+    if user_agent:
+        entries = [dict(e, request=fill_user_agent(e["request"], user_agent)) for e in entries]
+
+    examples = {f"test_{e['id']}": e for e in entries}
+    messages = {key: render_captcha_example(e) for key, e in examples.items()}
+    run_kbs = {
+        key: InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="▶️ Run it live", callback_data=f"run_{e['id']}")]
+        ])
+        for key, e in examples.items()
+    }
+
+    documents = []
+    for key, e in examples.items():
+        text, description = messages[key], "createTask example"
+        if "price" in e:
+            description = f"{per_1000(e['price'])} · createTask example"
+            text += f"\n\n💵 *Price:* {per_1000(e['price'])}"
+        task_class = e["request"].get("task", {}).get("class")
+        title = f"🧩 {e['type']}" + (f" ({task_class})" if task_class else "")
+        search_text = f"{title} {e['label']} {e.get('name', '')} {e['id']}"
+        documents.append((search_text, inline_article(key, title, description, text, e.get("docs"))))
+    documents.extend(extra_documents)
+
+    media = {}
+    for key, e in examples.items():
+        if e.get("gif"):
+            item = load_media(media_dir, e["gif"])
+            if item is not None:
+                media[key] = item
+
+    return CatalogSnapshot(
+        entries=tuple(entries),
+        examples=MappingProxyType(examples),
+        messages=MappingProxyType(messages),
+        run_kbs=MappingProxyType(run_kbs),
+        menus=MappingProxyType(build_menus(entries, page_size)),
+        index=SearchIndex(documents),
+        media=MappingProxyType(media),
+        version=version,
+    )
+
+
+def _file_version(path: str) -> tuple:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def load_snapshot(path: str, extra_documents=(), user_agent: str | None = None) -> CatalogSnapshot:
+    version = _file_version(path)
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return build_snapshot(data, extra_documents, version=version, user_agent=user_agent)
+
+
+class Catalog:
+    """
+    Holds the current snapshot and swaps in a new one when catalog.json, one
+    of the demo media files or the current user agent changes.
+    Parsing and rendering run in a worker thread; the swap itself is a single
+    attribute assignment, so handlers never wait for a reload. A broken file
+    is logged and the previous snapshot stays in use.
+    """
+
+    def __init__(self, path: str = CATALOG_PATH, extra_documents=(), poll_interval: float = CATALOG_POLL_INTERVAL):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._extra = tuple(extra_documents)
+        self.user_agent: str | None = None
+        self.current = load_snapshot(path, self._extra)
+        self._task: asyncio.Task | None = None
+
+    async def reload(self, force: bool = False) -> bool:
+        try:
+            version = _file_version(self.path)
+        except OSError as e:
+            logging.warning("Catalog %s is not readable: %s", self.path, e)
+            return False
+        if version == self.current.version and not self.current.media_changed() and not force:
+            return False
+        try:
+            snapshot = await asyncio.to_thread(load_snapshot, self.path, self._extra, self.user_agent)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.error("Catalog reload failed, keeping the previous version: %s", e)
+            # don't retry the same broken file on every tick
+            self.current = replace(self.current, version=version)
+            return False
+        self.current = snapshot
+        logging.info("Catalog reloaded: %s types", len(snapshot.entries))
+        return True
+
+    async def set_user_agent(self, user_agent: str):
+        """
+        Re-renders the examples with a new user agent (a UserAgentCache on_change hook).
+        """
+        self.user_agent = user_agent
+        await self.reload(force=True)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await self.reload()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+def export_prices(catalog_path: str = CATALOG_PATH,
+                  prices_path: str = os.path.join(ROOT, "frontend", "prices.json")):
+    """
+    Writes the price list the frontend and backend read (one type per line).
+    """
+    with open(catalog_path, encoding="utf-8") as f:
+        entries = json.load(f)["types"]
+    rows = [{"name": e["name"], "price": e["price"], "gif": e["gif"], "docs": e["docs"]}
+            for e in entries if "price" in e]
+    with open(prices_path, "w", encoding="utf-8") as f:
+        f.write("[\n" + ",\n".join("  " + json.dumps(r, ensure_ascii=False) for r in rows) + "\n]\n")
+    print(f"✅ Wrote {len(rows)} prices to {prices_path}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["export-prices"]:
+        sys.exit(__doc__)
+    export_prices()
@@ -0,0 +1,295 @@
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+# -------------------------------
+# Key store settings (override via .env)
+# -------------------------------
+KEYSTORE_BACKEND = os.getenv("KEYSTORE_BACKEND", "sqlite")   # "sqlite" or "memory"
+# next to this module by default, so every worker finds the same file whatever its working directory
+KEYSTORE_PATH = os.getenv("KEYSTORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "keys.db"))
+KEYSTORE_SECRET = os.getenv("KEYSTORE_SECRET", "")          # encrypts API keys at rest
+KEYSTORE_CACHE_SIZE = int(os.getenv("KEYSTORE_CACHE_SIZE", "10000"))
+KEYSTORE_CACHE_TTL = float(os.getenv("KEYSTORE_CACHE_TTL", "60"))  # bounds staleness between workers
+KEYSTORE_FLUSH_INTERVAL = float(os.getenv("KEYSTORE_FLUSH_INTERVAL", "0.05"))
+KEYSTORE_BATCH_SIZE = int(os.getenv("KEYSTORE_BATCH_SIZE", "500"))
+# scrypt turns KEYSTORE_SECRET into the Fernet key: ~0.1 s and 32 MB once per worker start,
+# and the same for every guess of someone holding a copy of keys.db
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2 ** 15, 8, 1
+SALT_BYTES = 16
+
+
+def derive_key(secret: str, salt: bytes) -> bytes:
+    key = hashlib.scrypt(secret.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P,
+                         maxmem=256 * SCRYPT_N * SCRYPT_R, dklen=32)
+    return base64.urlsafe_b64encode(key)
+
+
+def _legacy_key(secret: str) -> bytes:
+    # unsalted SHA-256, used before the salted KDF; only read to migrate old rows
+    return base64.urlsafe_b64encode(hashlib.sha256(secret.encode()).digest())
+
+
+class MemoryKeyStore:
+    """
+    Process-local store — fine for local development, lost on restart.
+    """
+
+    def __init__(self):
+        self._keys: dict[int, str] = {}
+        # user_id -> [threshold, alerted]
+        self._alerts: dict[int, list] = {}
+
+    async def get(self, user_id: int) -> str | None:
+        return self._keys.get(user_id)
+
+    async def set(self, user_id: int, api_key: str):
+        self._keys[user_id] = api_key
+
+    async def set_threshold(self, user_id: int, threshold: float | None):
+        if threshold is None:
+            self._alerts.pop(user_id, None)
+        else:
+            self._alerts[user_id] = [threshold, False]
+
+    async def set_alerted(self, user_id: int, alerted: bool):
+        if user_id in self._alerts:
+            self._alerts[user_id][1] = alerted
+
+    async def alert_subscriptions(self) -> list[tuple[int, str, float, bool]]:
+        return [(uid, self._keys[uid], threshold, alerted)
+                for uid, (threshold, alerted) in self._alerts.items() if uid in self._keys]
+
+    async def close(self):
+        pass
+
+
+class SQLiteKeyStore:
+    """
+    SQLite (WAL) store shared by every bot worker on the host.
+    API keys are Fernet-encrypted under a key derived from the secret with
+    scrypt and a random salt kept in the database. Reads go through an LRU cache and writes
+    are group-committed: all keys submitted within one flush interval land
+    in a single transaction.
+    """
+
+    def __init__(self, path: str, secret: str, cache_size: int = KEYSTORE_CACHE_SIZE,
+                 cache_ttl: float = KEYSTORE_CACHE_TTL):
+        self.path = path
+        self._cache: OrderedDict[int, tuple[float, str | None]] = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_ttl = cache_ttl
+        self._pending: dict[int, tuple[bytes, asyncio.Future]] = {}
+        self._flusher: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._closing = False
+        # sqlite is blocking — all access goes through one dedicated thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="keystore")
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS api_keys (user_id INTEGER PRIMARY KEY, token BLOB NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS balance_alerts ("
+            "user_id INTEGER PRIMARY KEY, threshold REAL NOT NULL, alerted INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS keystore_meta (name TEXT PRIMARY KEY, value BLOB NOT NULL)")
+        self._fernet = self._open_fernet(secret)
+
+    def _open_fernet(self, secret: str) -> MultiFernet:
+        """
+        The first worker to open a database without a salt creates one and
+        re-encrypts the rows written under the old unsalted key, in the same
+        transaction. The old key still decrypts, for workers not yet restarted.
+        """
+        legacy = Fernet(_legacy_key(secret))
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute("SELECT value FROM keystore_meta WHERE name = 'salt'").fetchone()
+            salt = row[0] if row else os.urandom(SALT_BYTES)
+            fernet = Fernet(derive_key(secret, salt))
+            if row is None:
+                self._conn.execute("INSERT INTO keystore_meta (name, value) VALUES ('salt', ?)", (salt,))
+                migrated = []
+                for user_id, token in self._conn.execute("SELECT user_id, token FROM api_keys").fetchall():
+                    try:
+                        migrated.append((fernet.encrypt(legacy.decrypt(token)), user_id))
+                    except InvalidToken:
+                        continue
+                self._conn.executemany("UPDATE api_keys SET token = ? WHERE user_id = ?", migrated)
+                if migrated:
+                    logging.info("Re-encrypted %d saved API keys with the salted key", len(migrated))
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return MultiFernet([fernet, legacy])
+
+    # --- cache ---
+    def _cache_get(self, user_id: int):
+        entry = self._cache.get(user_id)
+        if entry is None or time.monotonic() - entry[0] > self._cache_ttl:
+            return False, None
+        self._cache.move_to_end(user_id)
+        return True, entry[1]
+
+    def _cache_put(self, user_id: int, api_key: str | None):
+        self._cache[user_id] = (time.monotonic(), api_key)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    # --- blocking helpers (run on the store thread) ---
+    def _select(self, user_id: int) -> bytes | None:
+        row = self._conn.execute("SELECT token FROM api_keys WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def _write_batch(self, rows: list[tuple[int, bytes]]):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.executemany(
+                "INSERT INTO api_keys (user_id, token) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET token = excluded.token",
+                rows,
+            )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _select_alerts(self) -> list[tuple[int, str, float, bool]]:
+        rows = self._conn.execute(
+            "SELECT a.user_id, k.token, a.threshold, a.alerted "
+            "FROM balance_alerts a JOIN api_keys k ON k.user_id = a.user_id"
+        ).fetchall()
+        result = []
+        for user_id, token, threshold, alerted in rows:
+            try:
+                api_key = self._fernet.decrypt(token).decode()
+            except InvalidToken:
+                continue
+            result.append((user_id, api_key, threshold, bool(alerted)))
+        return result
+
+    def _execute(self, sql: str, params: tuple):
+        self._conn.execute(sql, params)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # --- public API ---
+    async def get(self, user_id: int) -> str | None:
+        hit, api_key = self._cache_get(user_id)
+        if hit:
+            return api_key
+        pending = self._pending.get(user_id)
+        if pending is not None:
+            return self._fernet.decrypt(pending[0]).decode()
+
+        token = await self._run(self._select, user_id)
+        api_key = None
+        if token is not None:
+            try:
+                api_key = self._fernet.decrypt(token).decode()
+            except InvalidToken:
+                logging.warning("Stored API key for user %s cannot be decrypted (wrong KEYSTORE_SECRET?)", user_id)
+        self._cache_put(user_id, api_key)
+        return api_key
+
+    async def set(self, user_id: int, api_key: str):
+        """
+        Returns once the key is committed to disk (together with the rest of its batch).
+        """
+        loop = asyncio.get_running_loop()
+        if self._flusher is None:
+            self._wakeup = asyncio.Event()
+            self._flusher = loop.create_task(self._flush_loop())
+
+        token = self._fernet.encrypt(api_key.encode())
+        previous = self._pending.get(user_id)
+        future = previous[1] if previous else loop.create_future()
+        self._pending[user_id] = (token, future)
+        self._cache_put(user_id, api_key)
+        if len(self._pending) >= KEYSTORE_BATCH_SIZE:
+            self._wakeup.set()
+        await asyncio.shield(future)
+
+    async def set_threshold(self, user_id: int, threshold: float | None):
+        """
+        Low-balance alert threshold in USD; None turns alerts off.
+        """
+        if threshold is None:
+            await self._run(self._execute, "DELETE FROM balance_alerts WHERE user_id = ?", (user_id,))
+        else:
+            await self._run(
+                self._execute,
+                "INSERT INTO balance_alerts (user_id, threshold, alerted) VALUES (?, ?, 0) "
+                "ON CONFLICT(user_id) DO UPDATE SET threshold = excluded.threshold, alerted = 0",
+                (user_id, threshold),
+            )
+
+    async def set_alerted(self, user_id: int, alerted: bool):
+        await self._run(self._execute, "UPDATE balance_alerts SET alerted = ? WHERE user_id = ?",
+                        (int(alerted), user_id))
+
+    async def alert_subscriptions(self) -> list[tuple[int, str, float, bool]]:
+        """
+        (user_id, api_key, threshold, alerted) for every user with an alert and a saved key.
+        Keys are decrypted on the store thread, not on the event loop.
+        """
+        await self._flush()
+        return await self._run(self._select_alerts)
+
+    async def _flush_loop(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=KEYSTORE_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._flush()
+
+    async def _flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        try:
+            await self._run(self._write_batch, [(uid, token) for uid, (token, _) in batch.items()])
+        except Exception as e:
+            logging.exception("Key store flush failed")
+            for _, future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for _, future in batch.values():
+            if not future.done():
+                future.set_result(None)
+
+    async def close(self):
+        self._closing = True
+        if self._flusher is not None:
+            self._wakeup.set()
+            await self._flusher
+            self._flusher = None
+        await self._flush()
+        await self._run(self._conn.close)
+        self._executor.shutdown(wait=True)
+
+
+def create_key_store():
+    if KEYSTORE_BACKEND == "sqlite":
+        if KEYSTORE_SECRET:
+            return SQLiteKeyStore(KEYSTORE_PATH, KEYSTORE_SECRET)
+        logging.warning("KEYSTORE_SECRET is not set — API keys are kept in memory only.")
+    return MemoryKeyStore()
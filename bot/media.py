@@ -0,0 +1,118 @@
+import asyncio
+import json
+import logging
+import os
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+
+from catalog import Media
+
+# -------------------------------
+# Demo media settings (override via .env)
+# -------------------------------
+DEMO_MEDIA = os.getenv("DEMO_MEDIA", "1") == "1"                       # attach demo animations to examples
+# content hash -> Telegram file_id; next to this module, whatever the working directory
+MEDIA_CACHE_PATH = os.getenv("MEDIA_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                              "media_file_ids.json"))
+
+
+class FileIdCache:
+    """
+    Persistent map of content hash -> Telegram file_id. A changed file has a
+    new hash, so it simply misses and gets uploaded again. file_ids belong to
+    one bot token, so the file should not be shared between bots.
+    """
+
+    def __init__(self, path: str = MEDIA_CACHE_PATH):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                self._ids: dict[str, str] = json.load(f)
+        except FileNotFoundError:
+            self._ids = {}
+        except (OSError, ValueError) as e:
+            logging.warning("Media cache %s is unreadable, starting empty: %s", path, e)
+            self._ids = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def get(self, digest: str) -> str | None:
+        return self._ids.get(digest)
+
+    def put(self, digest: str, file_id: str):
+        self._ids[digest] = file_id
+        self._save()
+
+    def drop(self, digest: str):
+        if self._ids.pop(digest, None) is not None:
+            self._save()
+
+    def _save(self):
+        # a few dozen short entries — write a temp file and rename it over the old one
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._ids, f, indent=1)
+        os.replace(tmp, self.path)
+
+
+def _file_id(message: Message) -> str | None:
+    if message.animation:
+        return message.animation.file_id
+    if message.photo:
+        return message.photo[-1].file_id
+    if message.document:
+        return message.document.file_id
+    return None
+
+
+class DemoSender:
+    """
+    Sends demo media by cached file_id; only the first send of each file
+    uploads it. Concurrent first sends of the same file share one upload.
+    """
+
+    def __init__(self, cache: FileIdCache):
+        self.cache = cache
+        self._uploads: dict[str, asyncio.Future] = {}
+        self.uploads = 0
+
+    @staticmethod
+    async def _send(message: Message, media: Media, source, caption: str) -> Message:
+        if media.kind == "animation":
+            return await message.answer_animation(source, caption=caption)
+        if media.kind == "photo":
+            return await message.answer_photo(source, caption=caption)
+        return await message.answer_document(source, caption=caption)
+
+    async def send(self, message: Message, media: Media, caption: str = ""):
+        file_id = self.cache.get(media.digest)
+        if file_id is not None:
+            try:
+                return await self._send(message, media, file_id, caption)
+            except TelegramBadRequest as e:
+                # e.g. the bot token changed — file_ids don't carry over
+                logging.warning("Cached file_id for %s rejected, uploading again: %s", media.path, e)
+                self.cache.drop(media.digest)
+
+        # after a failed upload every waiter wakes up; the first one uploads again
+        # and the rest find its future here and wait for that one instead
+        while (pending := self._uploads.get(media.digest)) is not None:
+            file_id = await asyncio.shield(pending)
+            if file_id is not None:
+                return await self._send(message, media, file_id, caption)
+
+        future = self._uploads[media.digest] = asyncio.get_running_loop().create_future()
+        file_id = None
+        try:
+            sent = await self._send(message, media, FSInputFile(media.path), caption)
+            self.uploads += 1
+            file_id = _file_id(sent)
+            if file_id is not None:
+                self.cache.put(media.digest, file_id)
+            return sent
+        finally:
+            future.set_result(file_id)
+            if self._uploads.get(media.digest) is future:
+                del self._uploads[media.digest]
@@ -0,0 +1,48 @@
+"""
+Posts recorded Telegram updates to a locally running webhook worker.
+
+    cd bot
+    BOT_MODE=webhook WEBHOOK_SECRET=dev-secret python bot.py
+    WEBHOOK_SECRET=dev-secret python post_update.py samples/*.json --repeat 100
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from webhook import WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET  # noqa: E402
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="+", help="recorded update JSON files")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    updates = []
+    for path in args.files:
+        with open(path, encoding="utf-8") as f:
+            updates.append(json.load(f))
+
+    headers = {"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET} if WEBHOOK_SECRET else {}
+    statuses = {}
+    t0 = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        async def post(update):
+            async with session.post(args.url, json=update, headers=headers) as resp:
+                statuses[resp.status] = statuses.get(resp.status, 0) + 1
+
+        await asyncio.gather(*(post(u) for _ in range(args.repeat) for u in updates))
+    elapsed = time.perf_counter() - t0
+    total = sum(statuses.values())
+    print(f"posted {total} updates in {elapsed:.2f}s ({total / elapsed:.0f}/s), statuses: {statuses}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
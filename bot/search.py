@@ -0,0 +1,86 @@
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+# -------------------------------
+# Fuzzy search over a fixed set of documents (inline mode).
+# Everything is indexed once at start-up; a query is a few dict lookups.
+# -------------------------------
+MAX_PREFIX = 12
+MIN_TRIGRAM_SCORE = 0.34
+
+_WORD = re.compile(r"[a-z0-9]+")
+# camelCase / digit boundaries: "RecaptchaV2Task" -> "recaptcha v2 task"
+_BOUNDARY = re.compile(r"(?<=[a-z])(?=[A-Z0-9])|(?<=[0-9])(?=[A-Za-z])")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Words of `text`, lowercased, with camelCase parts split out as extra words.
+    """
+    words = _WORD.findall(text.lower())
+    parts = _WORD.findall(_BOUNDARY.sub(" ", text).lower())
+    return list(dict.fromkeys(words + parts))
+
+
+def trigrams(word: str) -> set[str]:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """
+    Prefix index (every prefix of every token, up to MAX_PREFIX chars) for
+    as-you-type matches, plus a trigram index so typos still find something
+    ("turnstil", "recapcha"). Results for a query are memoized.
+    """
+
+    def __init__(self, documents: list[tuple[str, object]]):
+        """
+        `documents` is a list of (searchable text, result) in default display order.
+        """
+        self._results = [result for _, result in documents]
+        self._prefixes: dict[str, set[int]] = defaultdict(set)
+        self._trigrams: dict[str, set[int]] = defaultdict(set)
+        self._doc_trigrams: list[dict[str, set[str]]] = []
+        for doc_id, (text, _) in enumerate(documents):
+            grams = {}
+            for token in tokenize(text):
+                for n in range(1, min(len(token), MAX_PREFIX) + 1):
+                    self._prefixes[token[:n]].add(doc_id)
+                grams[token] = trigrams(token)
+                for gram in grams[token]:
+                    self._trigrams[gram].add(doc_id)
+            self._doc_trigrams.append(grams)
+        self._prefixes = dict(self._prefixes)
+        self._trigrams = dict(self._trigrams)
+        self.search = lru_cache(maxsize=4096)(self._search)
+
+    def _fuzzy(self, word: str) -> dict[int, float]:
+        query = trigrams(word)
+        candidates = set()
+        for gram in query:
+            candidates |= self._trigrams.get(gram, set())
+        scores = {}
+        for doc_id in candidates:
+            best = max(len(query & grams) / len(query | grams) for grams in self._doc_trigrams[doc_id].values())
+            if best >= MIN_TRIGRAM_SCORE:
+                scores[doc_id] = best
+        return scores
+
+    def _search(self, query: str, limit: int = 50) -> tuple:
+        words = _WORD.findall(query.lower())
+        if not words:
+            return tuple(self._results[:limit])
+
+        totals: dict[int, float] | None = None
+        for word in words:
+            hits = {doc_id: 2.0 for doc_id in self._prefixes.get(word[:MAX_PREFIX], ())}
+            if not hits:
+                hits = self._fuzzy(word)
+            # every word has to match something (AND)
+            totals = hits if totals is None else {d: totals[d] + s for d, s in hits.items() if d in totals}
+            if not totals:
+                return ()
+        ranked = sorted(totals, key=lambda d: (-totals[d], d))
+        return tuple(self._results[d] for d in ranked[:limit])
@@ -0,0 +1,207 @@
+import contextvars
+import cProfile
+import logging
+import math
+import os
+import time
+from bisect import bisect_left
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+try:
+    import pyinstrument
+except ImportError:  # pyinstrument is optional — cProfile is always available
+    pyinstrument = None
+
+# -------------------------------
+# Handler stats & profiling settings (override via .env)
+# -------------------------------
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").replace(",", " ").split()}  # may use /stats
+PROFILE_UPDATES = int(os.getenv("PROFILE_UPDATES", "0"))     # profile the first N updates after start
+PROFILE_PATH = os.getenv("PROFILE_PATH", "bot_profile")      # .prof (cProfile) or .html (pyinstrument) is added
+PROFILER = os.getenv("PROFILER", "cprofile")                 # "cprofile" or "pyinstrument"
+
+# 0.5 ms … ~100 s, 25% apart: percentiles are accurate to within one bucket
+BUCKETS = tuple(0.0005 * 1.25 ** i for i in range(56))
+
+# seconds spent in CapMonster / Telegram calls by the update being handled
+_timing: contextvars.ContextVar[list | None] = contextvars.ContextVar("handler_timing", default=None)
+
+
+class Histogram:
+    """
+    Fixed-size latency histogram: one counter per bucket, nothing else
+    grows with the number of observations.
+    """
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * p))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return BUCKETS[min(i, len(BUCKETS) - 1)]
+        return BUCKETS[-1]
+
+
+class HandlerStat:
+    __slots__ = ("total", "upstream", "telegram", "own", "errors")
+
+    def __init__(self):
+        self.total = Histogram()
+        self.upstream = Histogram()
+        self.telegram = Histogram()
+        self.own = Histogram()
+        self.errors = 0
+
+
+class HandlerStats(BaseMiddleware):
+    """
+    Inner middleware on every observer: times each handler and splits the time
+    into upstream (CapMonster), Telegram (Bot API calls, including pacing waits)
+    and the rest (our own code). The two outbound sides report through
+    `add_upstream` and TelegramTimer via a context variable, so concurrent
+    updates don't mix.
+    """
+
+    def __init__(self):
+        self.handlers: dict[str, HandlerStat] = {}
+        self.started = time.time()
+
+    @staticmethod
+    def add_upstream(method: str, elapsed: float):
+        timing = _timing.get()
+        if timing is not None:
+            timing[0] += elapsed
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", type(event).__name__)
+        stat = self.handlers.get(name)
+        if stat is None:
+            stat = self.handlers[name] = HandlerStat()
+
+        timing = [0.0, 0.0]
+        token = _timing.set(timing)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            stat.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            _timing.reset(token)
+            stat.total.observe(elapsed)
+            stat.upstream.observe(timing[0])
+            stat.telegram.observe(timing[1])
+            stat.own.observe(max(0.0, elapsed - timing[0] - timing[1]))
+
+    def render(self) -> str:
+        """
+        Plain-text table for /stats (sent inside a code block).
+        """
+        def ms(h: Histogram, p: float) -> str:
+            return f"{h.percentile(p) * 1000:.0f}"
+
+        uptime = (time.time() - self.started) / 3600
+        lines = [f"uptime {uptime:.1f}h, ms: p50/p95/p99 total | p95 upstream, telegram, own"]
+        ordered = sorted(self.handlers.items(), key=lambda kv: -kv[1].total.count)
+        for name, s in ordered:
+            lines.append(
+                f"{name[:22]:<22} n={s.total.count} err={s.errors}\n"
+                f"  {ms(s.total, .5)}/{ms(s.total, .95)}/{ms(s.total, .99)} | "
+                f"{ms(s.upstream, .95)}, {ms(s.telegram, .95)}, {ms(s.own, .95)}"
+            )
+        return "\n".join(lines) if ordered else "No updates handled yet."
+
+
+class TelegramTimer(BaseRequestMiddleware):
+    """
+    Session middleware adding the duration of each Bot API call to the
+    handler that made it.
+    """
+
+    async def __call__(self, make_request, bot, method):
+        timing = _timing.get()
+        if timing is None:
+            return await make_request(bot, method)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            timing[1] += time.perf_counter() - started
+
+
+class UpdateProfiler(BaseMiddleware):
+    """
+    Outer update middleware that profiles the next N updates and writes the
+    result to PROFILE_PATH (.prof for cProfile — open with snakeviz or pstats,
+    .html for pyinstrument).
+    """
+
+    def __init__(self, updates: int = PROFILE_UPDATES, path: str = PROFILE_PATH, profiler: str = PROFILER):
+        self.path = path
+        self.kind = "pyinstrument" if profiler == "pyinstrument" and pyinstrument is not None else "cprofile"
+        if profiler == "pyinstrument" and pyinstrument is None:
+            logging.warning("pyinstrument is not installed — profiling with cProfile")
+        self.remaining = 0
+        self.in_flight = 0
+        self._profiler = None
+        if updates:
+            self.arm(updates)
+
+    def arm(self, updates: int):
+        self.remaining = updates
+
+    def _start(self):
+        if self.kind == "pyinstrument":
+            self._profiler = pyinstrument.Profiler(async_mode="disabled")
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def _finish(self) -> str:
+        profiler, self._profiler = self._profiler, None
+        if self.kind == "pyinstrument":
+            profiler.stop()
+            path = self.path + ".html"
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+        else:
+            profiler.disable()
+            path = self.path + ".prof"
+            profiler.dump_stats(path)
+        logging.info("Profile written to %s", path)
+        return path
+
+    async def __call__(self, handler, event, data):
+        if self.remaining <= 0:
+            return await handler(event, data)
+        if self._profiler is None:
+            self._start()
+        self.remaining -= 1
+        self.in_flight += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self.in_flight -= 1
+            # stop once the last profiled update is done
+            if self.remaining <= 0 and self.in_flight == 0 and self._profiler is not None:
+                self._finish()
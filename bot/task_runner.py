@@ -0,0 +1,175 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+
+import repo_root  # noqa: F401 — shared packages at the repository root
+from capmonster_client import CapMonsterAPIError, CapMonsterClient
+
+# -------------------------------
+# Live task runner settings (override via .env)
+# -------------------------------
+RUNNER_MAX_IN_FLIGHT = int(os.getenv("RUNNER_MAX_IN_FLIGHT", "50"))   # concurrent HTTP calls to CapMonster
+RUNNER_TASK_TIMEOUT = float(os.getenv("RUNNER_TASK_TIMEOUT", "180"))  # give up on a task after N seconds
+RUNNER_MAX_INTERVAL = float(os.getenv("RUNNER_MAX_INTERVAL", "10"))   # longest gap between two polls
+
+# Typical solve time in seconds when the catalog entry has no "solveTime" —
+# the first poll happens around then. Refined at runtime from what we observe.
+DEFAULT_SOLVE_TIME = 10
+
+
+@dataclass
+class LiveTask:
+    task_id: int
+    task_type: str
+    client_key: str
+    on_update: object  # async callable(text: str)
+    started: float = field(default_factory=time.monotonic)
+    polls: int = 0
+    interval: float = 1.0
+
+
+class TaskRunner:
+    """
+    Submits createTask and follows up with getTaskResult for any number of tasks.
+    All waiting tasks live in one heap ordered by their next poll time and a single
+    scheduler loop wakes up when the earliest one is due — no sleeping coroutine per
+    task. HTTP calls go through the shared client under a global concurrency cap.
+    """
+
+    def __init__(self, client: CapMonsterClient, max_in_flight: int = RUNNER_MAX_IN_FLIGHT,
+                 task_timeout: float = RUNNER_TASK_TIMEOUT):
+        self.client = client
+        self.task_timeout = task_timeout
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._heap: list[tuple[float, int, LiveTask]] = []
+        self._seq = itertools.count()
+        self._typical: dict[str, float] = {}  # task type -> observed solve time
+        self._wakeup: asyncio.Event | None = None
+        self._loop_task: asyncio.Task | None = None
+        self._polls: set[asyncio.Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._heap) + len(self._polls)
+
+    def _ensure_started(self):
+        if self._loop_task is None:
+            self._wakeup = asyncio.Event()
+            self._loop_task = asyncio.get_running_loop().create_task(self._scheduler())
+
+    async def _call(self, method: str, payload: dict, idempotent: bool = False) -> dict:
+        async with self._semaphore:
+            return await self.client.call(method, payload, idempotent=idempotent)
+
+    def _schedule(self, job: LiveTask, delay: float):
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), job))
+        self._wakeup.set()
+
+    async def submit(self, client_key: str, request: dict, task_type: str, on_update,
+                     solve_time: float | None = None):
+        """
+        Sends createTask; progress and the final result are reported through `on_update`.
+        `solve_time` is the catalog's typical solve time for the type, used until
+        real solves have been observed.
+        """
+        self._ensure_started()
+        payload = dict(request, clientKey=client_key)
+        started = time.monotonic()
+        try:
+            result = await self._call("createTask", payload)
+        except CapMonsterAPIError as e:
+            await self._notify(on_update, self._error_text(task_type, e))
+            return
+        except Exception as e:
+            await self._notify(on_update, f"❌ Connection error:\n`{e}`")
+            return
+
+        typical = self._typical.setdefault(task_type, solve_time or DEFAULT_SOLVE_TIME)
+        job = LiveTask(result["taskId"], task_type, client_key, on_update, started=started,
+                       interval=max(1.0, typical / 4))
+        await self._notify(on_update, f"⏳ *{task_type}* — task `{job.task_id}` created, solving...")
+        self._schedule(job, max(1.0, typical * 0.8))
+
+    async def _scheduler(self):
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, job = heapq.heappop(self._heap)
+            poll = asyncio.create_task(self._poll(job))
+            self._polls.add(poll)
+            poll.add_done_callback(self._polls.discard)
+
+    async def _poll(self, job: LiveTask):
+        job.polls += 1
+        try:
+            result = await self._call(
+                "getTaskResult", {"clientKey": job.client_key, "taskId": job.task_id}, idempotent=True,
+            )
+        except CapMonsterAPIError as e:
+            await self._notify(job.on_update, self._error_text(job.task_type, e))
+            return
+        except Exception as e:
+            result = None
+            logging.warning("getTaskResult failed for task %s: %s", job.task_id, e)
+
+        elapsed = time.monotonic() - job.started
+        if result is not None and result.get("status") == "ready":
+            self._learn(job.task_type, elapsed)
+            solution = json.dumps(result.get("solution", {}), indent=2)
+            if len(solution) > 800:
+                solution = solution[:800] + "\n..."
+            await self._notify(
+                job.on_update,
+                f"✅ *{job.task_type}* solved in *{elapsed:.1f}s* ({job.polls} polls)\n\n"
+                f"```json\n{solution}\n```",
+            )
+            return
+        if elapsed >= self.task_timeout:
+            await self._notify(job.on_update, f"⌛ *{job.task_type}* — no result after {elapsed:.0f}s, giving up.")
+            return
+
+        await self._notify(
+            job.on_update,
+            f"⏳ *{job.task_type}* — task `{job.task_id}` processing... {elapsed:.0f}s (poll #{job.polls})",
+        )
+        delay = job.interval
+        job.interval = min(job.interval * 1.5, RUNNER_MAX_INTERVAL)
+        self._schedule(job, delay)
+
+    def _learn(self, task_type: str, elapsed: float):
+        # exponential moving average of observed solve times
+        previous = self._typical.get(task_type, DEFAULT_SOLVE_TIME)
+        self._typical[task_type] = previous * 0.8 + elapsed * 0.2
+
+    @staticmethod
+    def _error_text(task_type: str, error: CapMonsterAPIError) -> str:
+        return f"❌ *{task_type}* — `{error.code}`\n{error.description}"
+
+    @staticmethod
+    async def _notify(on_update, text: str):
+        try:
+            await on_update(text)
+        except Exception as e:
+            logging.debug("Progress update failed: %s", e)
+
+    async def close(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+        for poll in list(self._polls):
+            poll.cancel()
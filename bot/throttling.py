@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import CallbackQuery, Message
+
+# -------------------------------
+# Incoming: per-user throttling (override via .env)
+# -------------------------------
+USER_RATE = float(os.getenv("THROTTLE_USER_RATE", "2"))          # updates per second, sustained
+USER_BURST = float(os.getenv("THROTTLE_USER_BURST", "5"))        # updates allowed back to back
+DEDUPE_WINDOW = float(os.getenv("THROTTLE_DEDUPE_WINDOW", "1"))  # seconds; same button twice = double tap
+MAX_TRACKED_USERS = 100_000
+SLOW_DOWN_TEXT = "⏳ You're sending messages too fast — please send that one again in a moment."
+
+# -------------------------------
+# Outgoing: Telegram send limits (override via .env)
+# -------------------------------
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))  # messages per second, whole bot
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))       # messages per second, one chat
+SEND_CHAT_BURST = int(os.getenv("SEND_CHAT_BURST", "3"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))     # retries after a 429 with retry_after
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Token bucket per user in front of every handler. Callback queries that
+    repeat the previous one within DEDUPE_WINDOW (double taps) are dropped
+    even when tokens are left. Dropped callbacks are still answered so the
+    button stops spinning; a dropped message (it may be the API key) gets one
+    "please resend" reply until the user is let through again.
+    """
+
+    def __init__(self, rate: float = USER_RATE, burst: float = USER_BURST, dedupe_window: float = DEDUPE_WINDOW):
+        self.rate = rate
+        self.burst = burst
+        self.dedupe_window = dedupe_window
+        # user_id -> [tokens, updated_at, last callback (message_id, data), last callback at, warned]
+        self._users: OrderedDict[int, list] = OrderedDict()
+        self.dropped = 0
+
+    def _allow(self, user_id: int, callback: tuple | None, now: float) -> bool:
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = [self.burst, now, None, 0.0, False]
+            if len(self._users) > MAX_TRACKED_USERS:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+
+        if callback is not None:
+            if callback == state[2] and now - state[3] < self.dedupe_window:
+                return False
+            state[2], state[3] = callback, now
+
+        state[0] = min(self.burst, state[0] + (now - state[1]) * self.rate)
+        state[1] = now
+        if state[0] < 1:
+            return False
+        state[0] -= 1
+        state[4] = False
+        return True
+
+    def _warn_once(self, user_id: int) -> bool:
+        state = self._users.get(user_id)
+        if state is None or state[4]:
+            return False
+        state[4] = True
+        return True
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        callback = (event.message.message_id if event.message else None, event.data) \
+            if isinstance(event, CallbackQuery) else None
+        if self._allow(user.id, callback, time.monotonic()):
+            return await handler(event, data)
+
+        self.dropped += 1
+        if isinstance(event, CallbackQuery):
+            await event.answer()
+        elif isinstance(event, Message) and self._warn_once(user.id):
+            await event.answer(SLOW_DOWN_TEXT)
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """
+    Session middleware every outgoing Bot API call passes through.
+
+    Calls addressed to a chat (sendMessage, editMessageText, ...) are spaced out
+    to stay under the per-chat and global limits: each call reserves the next
+    free slot (a GCRA-style virtual schedule) and sleeps until it comes, first
+    for its chat and then globally, so there is no queue task and no lock. Other calls (answerCallbackQuery, ...) go
+    straight through. A 429 pushes the chat's schedule back by retry_after and
+    the call is retried.
+    """
+
+    def __init__(self, global_rate: float = SEND_GLOBAL_RATE, chat_rate: float = SEND_CHAT_RATE,
+                 chat_burst: int = SEND_CHAT_BURST, max_retries: int = SEND_MAX_RETRIES):
+        self.global_interval = 1 / global_rate
+        self.chat_interval = 1 / chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global_tat = 0.0
+        # chat_id -> theoretical arrival time of the next call
+        self._chat_tat: dict[int | str, float] = {}
+        self.retried = 0
+
+    @property
+    def backlog(self) -> float:
+        """
+        Seconds until the global schedule is free again.
+        """
+        return max(0.0, self._global_tat - time.monotonic())
+
+    def _reserve_chat(self, chat_id, now: float) -> float:
+        tat = max(self._chat_tat.get(chat_id, 0.0), now)
+        start = max(now, tat - (self.chat_burst - 1) * self.chat_interval)
+        self._chat_tat[chat_id] = max(tat, start) + self.chat_interval
+        if len(self._chat_tat) > 10_000:
+            self._chat_tat = {c: t for c, t in self._chat_tat.items() if t > now}
+        return start
+
+    def _reserve_global(self, now: float) -> float:
+        # reserved only once the chat slot has come, so a chat that is far
+        # ahead never holds up the global schedule for everyone else
+        start = max(now, self._global_tat)
+        self._global_tat = start + self.global_interval
+        return start
+
+    def _penalize(self, chat_id, retry_after: float):
+        until = time.monotonic() + retry_after
+        if chat_id is None:
+            self._global_tat = max(self._global_tat, until)
+        else:
+            # the burst allowance must not let the retry in before `until`
+            until += (self.chat_burst - 1) * self.chat_interval
+            self._chat_tat[chat_id] = max(self._chat_tat.get(chat_id, 0.0), until)
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        for attempt in range(self.max_retries + 1):
+            if chat_id is not None:
+                for reserve in (lambda now: self._reserve_chat(chat_id, now), self._reserve_global):
+                    now = time.monotonic()
+                    delay = reserve(now) - now
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retried += 1
+                logging.warning("Telegram flood limit on %s (chat %s), retrying in %ss",
+                                type(method).__name__, chat_id, e.retry_after)
+                self._penalize(chat_id, e.retry_after)
+                if chat_id is None:
+                    await asyncio.sleep(e.retry_after)
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import os
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+# -------------------------------
+# Webhook settings (override via .env)
+# -------------------------------
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")          # public https URL, e.g. https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8080")))
+WEBHOOK_REGISTER = os.getenv("WEBHOOK_REGISTER", "1") == "1"   # only one worker needs to call setWebhook
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+WEBHOOK_SHUTDOWN_TIMEOUT = float(os.getenv("WEBHOOK_SHUTDOWN_TIMEOUT", "10"))
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", "1000"))  # accepted updates not yet done; beyond that 503
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """
+    Answers Telegram right away and handles the update in the background,
+    with at most `concurrency` updates running at once in this worker.
+    Once `max_pending` updates are accepted but not done, new ones get a 503:
+    Telegram keeps them and delivers them again later, so a burst waits
+    there instead of piling up in memory here. On shutdown, in-flight updates are given time to finish before the
+    bot session is closed.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, concurrency: int,
+                 max_pending: int = WEBHOOK_MAX_PENDING, **kwargs):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, **kwargs)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.max_pending = max_pending
+        self._saturated = False
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        if len(self._background_feed_update_tasks) >= self.max_pending:
+            if not self._saturated:
+                logging.warning("%d updates pending, answering 503 until some finish", self.max_pending)
+                self._saturated = True
+            return web.Response(status=503, text="Busy", headers={"Retry-After": "1"})
+        self._saturated = False
+        return await super()._handle_request_background(bot, request)
+
+    async def _background_feed_update(self, bot: Bot, update: dict):
+        async with self._semaphore:
+            await super()._background_feed_update(bot, update)
+
+    async def close(self):
+        pending = set(self._background_feed_update_tasks)
+        if pending:
+            logging.info("Waiting for %d in-flight updates...", len(pending))
+            _, still_running = await asyncio.wait(pending, timeout=WEBHOOK_SHUTDOWN_TIMEOUT)
+            for task in still_running:
+                task.cancel()
+        await super().close()
+
+
+def build_app(dp: Dispatcher, bot: Bot, concurrency: int) -> web.Application:
+    app = web.Application()
+
+    async def ping(request: web.Request):
+        return web.json_response({"status": "ok"})
+
+    async def on_startup(app: web.Application):
+        if WEBHOOK_REGISTER and WEBHOOK_BASE_URL:
+            await bot.set_webhook(
+                f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET or None,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            logging.info("Webhook registered at %s%s", WEBHOOK_BASE_URL, WEBHOOK_PATH)
+
+    app.router.add_get("/ping", ping)
+    BoundedRequestHandler(
+        dispatcher=dp, bot=bot, concurrency=concurrency, secret_token=WEBHOOK_SECRET or None,
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    app.on_startup.append(on_startup)
+    return app
+
+
+def run_webhook(dp: Dispatcher, bot: Bot, concurrency: int):
+    """
+    Serves Telegram updates over HTTP. Several workers can listen on the same
+    port (SO_REUSEPORT) or sit behind a load balancer; set WEBHOOK_REGISTER=0
+    on all but one of them.
+    """
+    if not WEBHOOK_SECRET:
+        logging.warning("WEBHOOK_SECRET is not set — webhook requests are not verified!")
+    app = build_app(dp, bot, concurrency)
+    web.run_app(
+        app,
+        host=WEBHOOK_HOST,
+        port=WEBHOOK_PORT,
+        reuse_port=True,
+        shutdown_timeout=WEBHOOK_SHUTDOWN_TIMEOUT,
+    )
@@ -0,0 +1,31 @@
+from .client import DEFAULT_API_URL, CapMonsterClient, decode_body
+from .errors import (
+    CapMonsterAPIError,
+    CapMonsterConnectionError,
+    CapMonsterError,
+    CapMonsterResponseError,
+    CaptchaUnsolvableError,
+    IPNotAllowedError,
+    KeyDoesNotExistError,
+    NoSuchTaskError,
+    TooManyRequestsError,
+    ZeroBalanceError,
+)
+from .user_agent import UserAgentCache
+
+__all__ = [
+    "DEFAULT_API_URL",
+    "CapMonsterClient",
+    "decode_body",
+    "UserAgentCache",
+    "CapMonsterError",
+    "CapMonsterAPIError",
+    "CapMonsterConnectionError",
+    "CapMonsterResponseError",
+    "CaptchaUnsolvableError",
+    "IPNotAllowedError",
+    "KeyDoesNotExistError",
+    "NoSuchTaskError",
+    "TooManyRequestsError",
+    "ZeroBalanceError",
+]
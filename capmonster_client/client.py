@@ -0,0 +1,180 @@
+import asyncio
+import random
+import time
+
+import aiohttp
+
+from .errors import (
+    CapMonsterConnectionError,
+    CapMonsterResponseError,
+    api_error,
+)
+
+try:
+    import orjson
+
+    def loads(data):
+        return orjson.loads(data)
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:  # orjson is optional — fall back to the standard library
+    import json
+
+    def loads(data):
+        return json.loads(data)
+
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+
+DEFAULT_API_URL = "https://api.capmonster.cloud"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _decode(status: int, body: bytes):
+    """
+    Returns (data, kind) where kind is "json", "string" (JSON sent as a JSON string) or "raw".
+    """
+    try:
+        data = loads(body)
+        if isinstance(data, str):
+            return loads(data), "string"
+        return data, "json"
+    except ValueError:
+        return None, "raw"
+
+
+def decode_body(status: int, body: bytes):
+    """
+    Parses a CapMonster body once. A body that decodes to a JSON string
+    (double-encoded JSON) is unwrapped; anything unparseable raises
+    CapMonsterResponseError with the raw text.
+    """
+    data, kind = _decode(status, body)
+    if kind == "raw":
+        raise CapMonsterResponseError(status, body.decode("utf-8", errors="replace"))
+    return data
+
+
+class CapMonsterClient:
+    """
+    Async client for api.capmonster.cloud.
+
+    One pooled session with keep-alive and DNS cache, socket timeouts on every
+    call, and jittered exponential backoff for idempotent methods
+    (getBalance, getTaskResult, getUserAgent). createTask is never retried.
+    Responses with errorId != 0 raise typed CapMonsterAPIError subclasses.
+    `on_decode(method, kind)` is called after every body is decoded and
+    `on_timing(method, seconds)` after every HTTP round-trip (for metrics).
+    """
+
+    def __init__(self, api_url: str = DEFAULT_API_URL, *, session: aiohttp.ClientSession | None = None,
+                 pool_size: int = 100, keepalive_timeout: float = 30, dns_cache_ttl: int = 300,
+                 connect_timeout: float = 5, read_timeout: float = 15,
+                 retries: int = 2, backoff_base: float = 0.2, backoff_max: float = 3.0,
+                 on_decode=None, on_timing=None):
+        self.api_url = api_url.rstrip("/")
+        self.on_decode = on_decode
+        self.on_timing = on_timing
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._session = session
+        self._owns_session = session is None
+        self._pool_size = pool_size
+        self._keepalive_timeout = keepalive_timeout
+        self._dns_cache_ttl = dns_cache_ttl
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # created lazily — a ClientSession needs a running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self._pool_size,
+                    keepalive_timeout=self._keepalive_timeout,
+                    use_dns_cache=True,
+                    ttl_dns_cache=self._dns_cache_ttl,
+                ),
+                timeout=aiohttp.ClientTimeout(
+                    total=None, sock_connect=self._connect_timeout, sock_read=self._read_timeout,
+                ),
+            )
+            self._owns_session = True
+        return self._session
+
+    async def close(self):
+        if self._session is not None and self._owns_session:
+            await self._session.close()
+        self._session = None
+
+    async def _send(self, http_method: str, path: str, payload: dict | None) -> tuple[int, bytes]:
+        kwargs = {}
+        if payload is not None:
+            kwargs["data"] = dumps(payload)
+            kwargs["headers"] = {"Content-Type": "application/json"}
+        started = time.perf_counter()
+        try:
+            async with self.session.request(http_method, f"{self.api_url}/{path}", **kwargs) as resp:
+                return resp.status, await resp.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise CapMonsterConnectionError(str(e) or type(e).__name__) from e
+        finally:
+            if self.on_timing is not None:
+                self.on_timing(path, time.perf_counter() - started)
+
+    async def _request(self, http_method: str, path: str, payload: dict | None, idempotent: bool) -> tuple[int, bytes]:
+        attempts = self.retries + 1 if idempotent else 1
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            try:
+                status, body = await self._send(http_method, path, payload)
+            except CapMonsterConnectionError:
+                if last:
+                    raise
+            else:
+                if status not in RETRY_STATUSES or last:
+                    return status, body
+            # full jitter: sleep somewhere between 0 and the exponential cap
+            await asyncio.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+
+    async def call(self, method: str, payload: dict, idempotent: bool = False) -> dict:
+        """
+        POSTs `payload` to /<method> and returns the decoded response.
+        Raises CapMonsterAPIError (or a subclass) when errorId != 0.
+        """
+        status, body = await self._request("POST", method, payload, idempotent)
+        data, kind = _decode(status, body)
+        if self.on_decode is not None:
+            self.on_decode(method, kind)
+        if not isinstance(data, dict):
+            raise CapMonsterResponseError(status, body.decode("utf-8", errors="replace"))
+        if data.get("errorId", 0) != 0:
+            raise api_error(data)
+        return data
+
+    async def get_balance(self, client_key: str) -> float:
+        data = await self.call("getBalance", {"clientKey": client_key}, idempotent=True)
+        return data["balance"]
+
+    async def create_task(self, client_key: str, task: dict, callback_url: str | None = None, **extra) -> int:
+        payload = {"clientKey": client_key, "task": task, **extra}
+        if callback_url:
+            payload["callbackUrl"] = callback_url
+        data = await self.call("createTask", payload)
+        return data["taskId"]
+
+    async def get_task_result(self, client_key: str, task_id: int) -> dict:
+        return await self.call("getTaskResult", {"clientKey": client_key, "taskId": task_id}, idempotent=True)
+
+    async def get_user_agent(self) -> str:
+        status, body = await self._request("GET", "useragent/actual", None, idempotent=True)
+        if status != 200:
+            raise CapMonsterResponseError(status, body.decode("utf-8", errors="replace"))
+        text = body.decode("utf-8", errors="replace").strip()
+        if text.startswith('"'):
+            text = loads(text)
+        return text
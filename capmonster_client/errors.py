@@ -0,0 +1,74 @@
+class CapMonsterError(Exception):
+    """
+    Base class for everything the client raises.
+    """
+
+
+class CapMonsterConnectionError(CapMonsterError):
+    """
+    Network problem or timeout — the request may not have reached CapMonster.
+    """
+
+
+class CapMonsterResponseError(CapMonsterError):
+    """
+    CapMonster answered with something that is not valid JSON.
+    """
+
+    def __init__(self, status: int, raw: str):
+        super().__init__(f"Unexpected response (HTTP {status})")
+        self.status = status
+        self.raw = raw
+
+
+class CapMonsterAPIError(CapMonsterError):
+    """
+    CapMonster answered with errorId != 0. The full response is kept in `.response`.
+    """
+
+    def __init__(self, response: dict):
+        self.response = response
+        self.code = response.get("errorCode") or "UNKNOWN_ERROR"
+        self.description = response.get("errorDescription") or ""
+        super().__init__(f"{self.code}: {self.description}" if self.description else self.code)
+
+
+class KeyDoesNotExistError(CapMonsterAPIError):
+    pass
+
+
+class ZeroBalanceError(CapMonsterAPIError):
+    pass
+
+
+class IPNotAllowedError(CapMonsterAPIError):
+    pass
+
+
+class NoSuchTaskError(CapMonsterAPIError):
+    pass
+
+
+class CaptchaUnsolvableError(CapMonsterAPIError):
+    pass
+
+
+class TooManyRequestsError(CapMonsterAPIError):
+    pass
+
+
+ERROR_CLASSES = {
+    "ERROR_KEY_DOES_NOT_EXIST": KeyDoesNotExistError,
+    "ERROR_ZERO_BALANCE": ZeroBalanceError,
+    "ERROR_IP_NOT_ALLOWED": IPNotAllowedError,
+    "ERROR_IP_BANNED": IPNotAllowedError,
+    "ERROR_NO_SUCH_CAPCHA_ID": NoSuchTaskError,
+    "WRONG_CAPTCHA_ID": NoSuchTaskError,
+    "ERROR_CAPTCHA_UNSOLVABLE": CaptchaUnsolvableError,
+    "ERROR_TOO_MUCH_REQUESTS": TooManyRequestsError,
+}
+
+
+def api_error(response: dict) -> CapMonsterAPIError:
+    cls = ERROR_CLASSES.get(response.get("errorCode"), CapMonsterAPIError)
+    return cls(response)
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import time
+
+DEFAULT_TTL = 3600       # seconds a user agent counts as current
+REFRESH_AHEAD = 0.8      # refresh once 80% of the TTL has passed
+RETRY_DELAY = 30         # first retry after a failed refresh, doubled up to the refresh interval
+
+
+class UserAgentCache:
+    """
+    The current Windows user agent (getUserAgent), refreshed by a background
+    task before it expires. Readers get the cached value and never wait on
+    CapMonster. If a refresh fails, the previous value keeps being served
+    (stale-while-revalidate) and the refresh is retried with backoff.
+    """
+
+    def __init__(self, fetch, ttl: float = DEFAULT_TTL, retry_delay: float = RETRY_DELAY, on_change=None):
+        """
+        `fetch` is a zero-argument coroutine function returning the user agent
+        (e.g. CapMonsterClient.get_user_agent). `on_change(user_agent)` is an
+        optional coroutine function awaited whenever a different value arrives.
+        """
+        self.fetch = fetch
+        self.ttl = ttl
+        self.retry_delay = retry_delay
+        self.on_change = on_change
+        self.value: str | None = None
+        self.fetched_at = 0.0
+        self._task: asyncio.Task | None = None
+
+    @property
+    def age(self) -> float | None:
+        return time.monotonic() - self.fetched_at if self.value is not None else None
+
+    @property
+    def stale(self) -> bool:
+        return self.value is None or self.age >= self.ttl
+
+    async def refresh(self) -> bool:
+        try:
+            user_agent = await self.fetch()
+        except Exception as e:
+            logging.warning("getUserAgent failed, keeping the cached value: %s", e)
+            return False
+        if not user_agent:
+            return False
+        changed, self.value = user_agent != self.value, user_agent
+        self.fetched_at = time.monotonic()
+        if changed and self.on_change is not None:
+            try:
+                await self.on_change(user_agent)
+            except Exception:
+                logging.exception("User agent change handler failed")
+        return True
+
+    async def _refresher(self):
+        refresh_every = self.ttl * REFRESH_AHEAD
+        delay = self.retry_delay
+        while True:
+            if await self.refresh():
+                delay = self.retry_delay
+                await asyncio.sleep(refresh_every)
+            else:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, refresh_every)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresher())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,170 @@
+"""
+Builds an optimized copy of the frontend into frontend/dist/.
+
+- demo animations (GIF) → animated WebP, plus MP4 when ffmpeg is on PATH
+- static demo images (PNG) → WebP (the original is kept when it is already smaller)
+- poster frames (first frame) in a few widths; the demo modal picks one for
+  the screen and shows it while the MP4 / animation loads
+- every generated asset gets a content hash in its file name
+- index.html, prices.json and manifest.json are pre-compressed to .gz and .br
+- dist/prices.json points at the hashed optimized assets
+
+    pip install -r frontend/requirements-build.txt
+    python frontend/build_assets.py            # add --no-mp4 to skip ffmpeg
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+from PIL import Image, ImageSequence
+
+try:
+    import brotli
+except ImportError:  # brotli is optional — only .gz variants are produced without it
+    brotli = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+POSTER_WIDTHS = (320, 640)
+WEBP_QUALITY = 60
+TEXT_FILES = ("index.html", "prices.json", "manifest.json")
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def write_hashed(out_dir: str, rel_dir: str, stem: str, ext: str, data: bytes) -> str:
+    """
+    Writes `data` as <rel_dir>/<stem>.<hash>.<ext> and returns that relative path.
+    """
+    rel = f"{rel_dir}/{stem}.{content_hash(data)}.{ext}"
+    path = os.path.join(out_dir, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return rel
+
+
+def to_webp(img: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    if getattr(img, "n_frames", 1) > 1:
+        frames = [frame.convert("RGBA") for frame in ImageSequence.Iterator(img)]
+        durations = [frame.info.get("duration", 100) for frame in ImageSequence.Iterator(img)]
+        frames[0].save(buf, "WEBP", save_all=True, append_images=frames[1:], duration=durations,
+                       loop=img.info.get("loop", 0), quality=WEBP_QUALITY, method=4,
+                       minimize_size=True, allow_mixed=True)
+    else:
+        img.save(buf, "WEBP", quality=WEBP_QUALITY + 20, method=4)
+    return buf.getvalue()
+
+
+def to_mp4(src: str) -> bytes | None:
+    if shutil.which("ffmpeg") is None:
+        return None
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "out.mp4")
+        result = subprocess.run(
+            ["ffmpeg", "-loglevel", "error", "-y", "-i", src, "-movflags", "+faststart",
+             "-pix_fmt", "yuv420p", "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2", "-an", out],
+            capture_output=True,
+        )
+        if result.returncode != 0:
+            print(f"  ! ffmpeg failed for {src}: {result.stderr.decode(errors='replace').strip()}")
+            return None
+        with open(out, "rb") as f:
+            return f.read()
+
+
+def posters(img: Image.Image) -> dict[str, bytes]:
+    img.seek(0)
+    first = img.convert("RGB")
+    result = {}
+    for w in sorted({min(width, first.width) for width in POSTER_WIDTHS}):
+        resized = first.resize((w, max(1, round(first.height * w / first.width))), Image.LANCZOS)
+        buf = io.BytesIO()
+        resized.save(buf, "WEBP", quality=WEBP_QUALITY, method=4)
+        result[str(w)] = buf.getvalue()
+    return result
+
+
+def build_asset(src_rel: str, out_dir: str, make_mp4: bool) -> dict:
+    src = os.path.join(HERE, src_rel)
+    rel_dir, name = os.path.split(src_rel)
+    stem, ext = os.path.splitext(name)
+    entry = {"source": src_rel}
+    with open(src, "rb") as f:
+        original = f.read()
+    with Image.open(src) as img:
+        animated = getattr(img, "n_frames", 1) > 1
+        webp = to_webp(img)
+        # keep the original when re-encoding doesn't pay off
+        if len(webp) < len(original):
+            entry["image"] = write_hashed(out_dir, rel_dir, stem, "webp", webp)
+        else:
+            entry["image"] = write_hashed(out_dir, rel_dir, stem, ext.lstrip("."), original)
+        entry["posters"] = {w: write_hashed(out_dir, rel_dir, f"{stem}-poster-{w}", "webp", data)
+                            for w, data in posters(img).items()}
+    if animated and make_mp4:
+        mp4 = to_mp4(src)
+        if mp4 is not None:
+            entry["mp4"] = write_hashed(out_dir, rel_dir, stem, "mp4", mp4)
+    after = os.path.getsize(os.path.join(out_dir, entry["image"]))
+    print(f"  {src_rel:<32} {len(original) / 1024:>8.0f} KB → {after / 1024:>7.0f} KB  {entry['image']}")
+    return entry
+
+
+def precompress(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def build(out_dir: str, make_mp4: bool = True):
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    with open(os.path.join(HERE, "prices.json"), encoding="utf-8") as f:
+        prices = json.load(f)
+
+    manifest = {"assets": {}}
+    for item in prices:
+        src_rel = item["gif"]
+        if src_rel not in manifest["assets"]:
+            manifest["assets"][src_rel] = build_asset(src_rel, out_dir, make_mp4)
+        asset = manifest["assets"][src_rel]
+        # prices.json in dist/ points at the optimized files
+        item["gif"] = asset["image"]
+        item["poster"] = asset["posters"]
+        if "mp4" in asset:
+            item["mp4"] = asset["mp4"]
+
+    with open(os.path.join(out_dir, "prices.json"), "w", encoding="utf-8") as f:
+        json.dump(prices, f, ensure_ascii=False, separators=(",", ":"))
+    shutil.copyfile(os.path.join(HERE, "index.html"), os.path.join(out_dir, "index.html"))
+    for name in ("index.html", "prices.json"):
+        with open(os.path.join(out_dir, name), "rb") as f:
+            manifest[name] = content_hash(f.read())
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    for name in TEXT_FILES:
+        precompress(os.path.join(out_dir, name))
+    print(f"✅ Built {len(manifest['assets'])} assets into {out_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=os.path.join(HERE, "dist"))
+    parser.add_argument("--no-mp4", action="store_true", help="skip MP4 even when ffmpeg is available")
+    args = parser.parse_args()
+    build(args.out, make_mp4=not args.no_mp4)
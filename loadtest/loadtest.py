@@ -0,0 +1,281 @@
+"""
+Load-test harness for the backend and the bot handlers against the local mock.
+
+Drives requests open-loop at a target rate (a slow server does not slow the
+generator down) and reports throughput, p50/p95/p99 latency and an error
+breakdown. Optional thresholds make it usable as a regression gate.
+
+    # backend: spawns the mock and uvicorn, then hits POST /get_balance
+    python loadtest/loadtest.py backend --rps 300 --duration 20 --keys 500 --double-encoded-rate 0.05
+
+    # against an already running backend (pointed at the mock or elsewhere)
+    python loadtest/loadtest.py backend --url http://127.0.0.1:8000 --no-spawn
+
+    # bot: calls the aiogram handlers in-process with stubbed Telegram sends
+    python loadtest/loadtest.py bot --rps 500 --duration 10 --api-error-rate 0.02
+
+    # fail the run on regressions
+    python loadtest/loadtest.py backend --max-p99-ms 250 --max-error-rate 0.01
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import aiohttp
+
+from mock_capmonster import add_mock_arguments
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Results:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.outcomes: Counter = Counter()
+        self.started = time.perf_counter()
+        self.finished = self.started
+
+    def record(self, latency: float, outcome: str):
+        self.latencies.append(latency)
+        self.outcomes[outcome] += 1
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+    @property
+    def error_rate(self) -> float:
+        total = sum(self.outcomes.values())
+        return (total - self.outcomes["ok"]) / total if total else 0.0
+
+    def report(self, title: str):
+        total = sum(self.outcomes.values())
+        elapsed = self.finished - self.started
+        print(f"\n== {title} ==")
+        print(f"requests     {total}  in {elapsed:.1f}s  →  {total / elapsed if elapsed else 0:.1f} req/s")
+        print(f"latency ms   p50 {self.percentile(0.50):.1f}   p95 {self.percentile(0.95):.1f}   "
+              f"p99 {self.percentile(0.99):.1f}   max {self.percentile(1.0):.1f}")
+        print(f"error rate   {self.error_rate:.2%}")
+        for outcome, n in self.outcomes.most_common():
+            print(f"  {outcome:<28} {n}")
+
+
+async def drive(rps: float, duration: float, one, max_outstanding: int) -> Results:
+    """
+    Fires `one()` at a fixed rate; `one` returns an outcome label.
+    """
+    results = Results()
+    outstanding: set[asyncio.Task] = set()
+    total = int(rps * duration)
+
+    async def timed():
+        t0 = time.perf_counter()
+        try:
+            outcome = await one()
+        except Exception as e:
+            outcome = f"exception:{type(e).__name__}"
+        results.record(time.perf_counter() - t0, outcome)
+
+    for i in range(total):
+        delay = results.started + i / rps - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(outstanding) >= max_outstanding:
+            results.outcomes["dropped:max_outstanding"] += 1
+            continue
+        task = asyncio.create_task(timed())
+        outstanding.add(task)
+        task.add_done_callback(outstanding.discard)
+    if outstanding:
+        await asyncio.wait(outstanding)
+    results.finished = time.perf_counter()
+    return results
+
+
+def spawn_mock(args) -> subprocess.Popen:
+    cmd = [sys.executable, os.path.join(ROOT, "loadtest", "mock_capmonster.py"),
+           "--port", str(args.mock_port), "--latency", args.latency,
+           "--http-error-rate", str(args.http_error_rate), "--api-error-rate", str(args.api_error_rate),
+           "--malformed-rate", str(args.malformed_rate), "--double-encoded-rate", str(args.double_encoded_rate),
+           "--solve-time", str(args.solve_time)]
+    if args.seed is not None:
+        cmd += ["--seed", str(args.seed)]
+    return subprocess.Popen(cmd)
+
+
+async def wait_until_up(url: str, timeout: float = 15):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url) as resp:
+                    await resp.read()
+                    return
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+# -------------------------------
+# Backend: POST /get_balance
+# -------------------------------
+def classify_balance(status: int, data) -> str:
+    if status != 200:
+        return f"http_{status}"
+    if not isinstance(data, dict):
+        return "non_object_body"
+    if "error" in data:
+        return "fallback:raw_text"
+    if data.get("errorId", 0) != 0:
+        return f"api:{data.get('errorCode')}"
+    return "ok" if "balance" in data else "no_balance"
+
+
+async def run_backend(args) -> Results:
+    procs = []
+    url = args.url
+    try:
+        if not args.no_spawn:
+            procs.append(spawn_mock(args))
+            env = dict(os.environ, CAPMONSTER_API=f"http://127.0.0.1:{args.mock_port}")
+            procs.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.backend_port), "--log-level", "warning"],
+                cwd=os.path.join(ROOT, "backend"), env=env,
+            ))
+            url = f"http://127.0.0.1:{args.backend_port}"
+            await wait_until_up(f"http://127.0.0.1:{args.mock_port}/_stats")
+        await wait_until_up(f"{url}/ping")
+
+        keys = [f"loadtest-key-{i:06d}" for i in range(args.keys)]
+        connector = aiohttp.TCPConnector(limit=args.max_outstanding)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            async def one():
+                form = aiohttp.FormData({"clientKey": random.choice(keys)})
+                async with session.post(f"{url}/get_balance", data=form) as resp:
+                    try:
+                        data = await resp.json(content_type=None)
+                    except ValueError:
+                        data = None
+                    return classify_balance(resp.status, data)
+
+            return await drive(args.rps, args.duration, one, args.max_outstanding)
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+
+
+# -------------------------------
+# Bot: simulated callbacks
+# -------------------------------
+BOT_CALLBACKS = ["check_balance", "check_balance", "menu_test", "test_more1", "test_more5",
+                 "test_temu", "test_imperva", "ep_createTask"]
+
+
+async def run_bot(args) -> Results:
+    mock = spawn_mock(args)
+    try:
+        os.environ["CAPMONSTER_API"] = f"http://127.0.0.1:{args.mock_port}"
+        os.environ.setdefault("BOT_TOKEN", "123456:LOADTEST-TOKEN-not-used-for-requests")
+        os.environ["KEYSTORE_BACKEND"] = "memory"
+        # demo media goes to the stubs below; keep their fake file_ids out of the real cache
+        os.environ["MEDIA_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "media_file_ids.json")
+        sys.path.insert(0, os.path.join(ROOT, "bot"))
+        import bot  # noqa: E402 — must see the environment above
+
+        await wait_until_up(f"http://127.0.0.1:{args.mock_port}/_stats")
+        users = list(range(1, args.keys + 1))
+        for user_id in users:
+            await bot.key_store.set(user_id, f"loadtest-key-{user_id:06d}")
+
+        handlers = {
+            "check_balance": bot.check_balance,
+            "menu_test": bot.captcha_types_menu,
+            "test_more1": bot.more_menu,
+            "test_more5": bot.more_menu,
+            "test_temu": bot.show_captcha_example,
+            "test_imperva": bot.show_captcha_example,
+            "ep_createTask": bot.show_endpoint_example,
+        }
+
+        async def one():
+            sent = []
+
+            async def send(text, **kwargs):
+                if args.telegram_latency:
+                    await asyncio.sleep(args.telegram_latency / 1000)
+                sent.append(text)
+
+            async def send_media(source, **kwargs):
+                if args.telegram_latency:
+                    await asyncio.sleep(args.telegram_latency / 1000)
+                # what Telegram sends back, as far as DemoSender looks at it
+                return SimpleNamespace(animation=SimpleNamespace(file_id="loadtest-file-id"), photo=None, document=None)
+
+            data = random.choice(BOT_CALLBACKS)
+            call = SimpleNamespace(
+                data=data, from_user=SimpleNamespace(id=random.choice(users)), answer=send,
+                message=SimpleNamespace(answer=send, edit_text=send, answer_animation=send_media,
+                                        answer_photo=send_media, answer_video=send_media,
+                                        answer_document=send_media),
+            )
+            await handlers[data](call)
+            text = sent[-1] if sent else ""
+            if text.startswith("❌ Connection error"):
+                return f"{data}:connection_error"
+            if text.startswith("❌"):
+                return f"{data}:api_error"
+            return "ok"
+
+        try:
+            return await drive(args.rps, args.duration, one, args.max_outstanding)
+        finally:
+            await bot.capmonster.close()
+            await bot.bot.session.close()
+    finally:
+        mock.terminate()
+        mock.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("target", choices=["backend", "bot"])
+    parser.add_argument("--rps", type=float, default=100)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--keys", type=int, default=100, help="distinct client keys / bot users")
+    parser.add_argument("--max-outstanding", type=int, default=1000)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--no-spawn", action="store_true", help="use an already running backend at --url")
+    parser.add_argument("--backend-port", type=int, default=8001)
+    parser.add_argument("--mock-port", type=int, default=9000)
+    parser.add_argument("--telegram-latency", type=float, default=0, help="simulated Telegram send time, ms")
+    parser.add_argument("--max-p99-ms", type=float)
+    parser.add_argument("--max-error-rate", type=float)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    runner = run_backend if args.target == "backend" else run_bot
+    results = asyncio.run(runner(args))
+    results.report(f"{args.target} @ {args.rps:g} req/s for {args.duration:g}s")
+
+    failed = False
+    if args.max_p99_ms is not None and results.percentile(0.99) > args.max_p99_ms:
+        print(f"FAIL: p99 {results.percentile(0.99):.1f} ms > {args.max_p99_ms} ms")
+        failed = True
+    if args.max_error_rate is not None and results.error_rate > args.max_error_rate:
+        print(f"FAIL: error rate {results.error_rate:.2%} > {args.max_error_rate:.2%}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Local stand-in for api.capmonster.cloud — no paid calls, fully configurable.
+
+Implements getBalance, createTask, getTaskResult and useragent/actual with
+configurable latency, HTTP errors, API errors and the broken bodies that
+backend/main.py has fallbacks for (malformed JSON, JSON sent as a string).
+Tasks created with a callbackUrl get the result POSTed there once solved
+(--callback-drop-rate loses some, to exercise the polling fallback).
+
+    python loadtest/mock_capmonster.py --port 9000 --latency lognormal:40:0.5 --http-error-rate 0.01
+    CAPMONSTER_API=http://127.0.0.1:9000 uvicorn main:app   # inside backend/
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import time
+from dataclasses import dataclass
+
+from aiohttp import ClientError, ClientSession, web
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36"
+)
+
+
+@dataclass
+class MockConfig:
+    latency: str = "fixed:20"        # fixed:MS | uniform:MIN:MAX | normal:MEAN:STD | lognormal:MEDIAN:SIGMA
+    http_error_rate: float = 0.0     # share of requests answered with HTTP 500
+    api_error_rate: float = 0.0      # share answered with errorId=1
+    malformed_rate: float = 0.0      # share answered with a body that is not JSON
+    double_encoded_rate: float = 0.0 # share answered with JSON encoded as a JSON string
+    solve_time: float = 3.0          # seconds until a created task is "ready"
+    callback_drop_rate: float = 0.0  # share of callbackUrl POSTs that are never sent
+    balance: float = 12.3456
+    seed: int | None = None
+
+
+def parse_latency(spec: str):
+    """
+    Returns a zero-argument function producing a delay in seconds. Values in the spec are milliseconds
+    (except the lognormal sigma).
+    """
+    kind, *args = spec.split(":")
+    a = [float(x) for x in args]
+    if kind == "fixed":
+        return lambda: a[0] / 1000
+    if kind == "uniform":
+        return lambda: random.uniform(a[0], a[1]) / 1000
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(a[0], a[1])) / 1000
+    if kind == "lognormal":
+        mu = math.log(a[0])
+        return lambda: random.lognormvariate(mu, a[1]) / 1000
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def build_app(config: MockConfig) -> web.Application:
+    if config.seed is not None:
+        random.seed(config.seed)
+    delay = parse_latency(config.latency)
+    task_ids = itertools.count(100000000)
+    tasks: dict[int, float] = {}
+    stats: dict[str, int] = {}
+    callbacks: set[asyncio.Task] = set()
+    solution = {"gRecaptchaResponse": "03AGdBq25SxXT-mock"}
+
+    def count(name: str):
+        stats[name] = stats.get(name, 0) + 1
+
+    async def respond(method: str, payload: dict) -> web.Response:
+        await asyncio.sleep(delay())
+        count(method)
+        roll = random.random()
+        if roll < config.http_error_rate:
+            count("http_500")
+            return web.Response(status=500, text="Internal Server Error")
+        roll -= config.http_error_rate
+        if roll < config.api_error_rate:
+            count("api_error")
+            payload = {"errorId": 1, "errorCode": "ERROR_KEY_DOES_NOT_EXIST",
+                       "errorDescription": "Account authorization key not found in the system"}
+        else:
+            roll -= config.api_error_rate
+            if roll < config.malformed_rate:
+                count("malformed")
+                return web.Response(status=200, text="<html><body>502 Bad Gateway</body></html>",
+                                    content_type="text/html")
+            roll -= config.malformed_rate
+            if roll < config.double_encoded_rate:
+                count("double_encoded")
+                return web.Response(status=200, text=json.dumps(json.dumps(payload)), content_type="text/plain")
+        return web.json_response(payload)
+
+    async def read_json(request: web.Request) -> dict:
+        try:
+            return await request.json()
+        except ValueError:
+            return {}
+
+    async def get_balance(request: web.Request):
+        await read_json(request)
+        return await respond("getBalance", {"errorId": 0, "balance": config.balance})
+
+    async def create_task(request: web.Request):
+        body = await read_json(request)
+        if not isinstance(body.get("task"), dict):
+            return await respond("createTask", {"errorId": 1, "errorCode": "ERROR_TASK_ABSENT",
+                                                "errorDescription": "Task property is empty or not set"})
+        task_id = next(task_ids)
+        tasks[task_id] = time.monotonic() + config.solve_time
+        if body.get("callbackUrl"):
+            callback = asyncio.create_task(send_callback(body["callbackUrl"], task_id))
+            callbacks.add(callback)
+            callback.add_done_callback(callbacks.discard)
+        return await respond("createTask", {"errorId": 0, "taskId": task_id})
+
+    async def send_callback(url: str, task_id: int):
+        await asyncio.sleep(config.solve_time)
+        if random.random() < config.callback_drop_rate:
+            count("callback_dropped")
+            return
+        count("callback")
+        try:
+            async with app["callback_session"].post(url, json={"errorId": 0, "taskId": task_id, "status": "ready",
+                                                               "solution": solution}) as resp:
+                await resp.read()
+        except ClientError as e:
+            count("callback_failed")
+            print(f"callback to {url} failed: {e}")
+
+    async def get_task_result(request: web.Request):
+        body = await read_json(request)
+        ready_at = tasks.get(body.get("taskId"))
+        if ready_at is None:
+            return await respond("getTaskResult", {"errorId": 1, "errorCode": "ERROR_NO_SUCH_CAPCHA_ID",
+                                                   "errorDescription": "Task not found"})
+        if time.monotonic() < ready_at:
+            return await respond("getTaskResult", {"errorId": 0, "status": "processing"})
+        tasks.pop(body.get("taskId"), None)
+        return await respond("getTaskResult", {"errorId": 0, "status": "ready", "solution": solution})
+
+    async def user_agent(request: web.Request):
+        await asyncio.sleep(delay())
+        count("useragent")
+        return web.Response(text=USER_AGENT)
+
+    async def mock_stats(request: web.Request):
+        return web.json_response(stats)
+
+    # ImageToText / ComplexImage tasks carry base64 images well over aiohttp's 1 MB default
+    app = web.Application(client_max_size=50 * 1024 * 1024)
+    app.router.add_post("/getBalance", get_balance)
+    app.router.add_post("/createTask", create_task)
+    app.router.add_post("/getTaskResult", get_task_result)
+    app.router.add_get("/useragent/actual", user_agent)
+    app.router.add_get("/_stats", mock_stats)
+    app["stats"] = stats
+
+    async def open_callback_session(app: web.Application):
+        app["callback_session"] = ClientSession()
+
+    async def close_callback_session(app: web.Application):
+        for callback in list(callbacks):
+            callback.cancel()
+        await app["callback_session"].close()
+
+    app.on_startup.append(open_callback_session)
+    app.on_cleanup.append(close_callback_session)
+    return app
+
+
+async def start_mock(config: MockConfig, host: str = "127.0.0.1", port: int = 9000) -> web.AppRunner:
+    """
+    Starts the mock inside the current event loop; call runner.cleanup() to stop.
+    """
+    runner = web.AppRunner(build_app(config), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", default=MockConfig.latency)
+    parser.add_argument("--http-error-rate", type=float, default=0.0)
+    parser.add_argument("--api-error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--double-encoded-rate", type=float, default=0.0)
+    parser.add_argument("--solve-time", type=float, default=MockConfig.solve_time)
+    parser.add_argument("--callback-drop-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+
+
+def config_from_args(args) -> MockConfig:
+    return MockConfig(
+        latency=args.latency,
+        http_error_rate=args.http_error_rate,
+        api_error_rate=args.api_error_rate,
+        malformed_rate=args.malformed_rate,
+        double_encoded_rate=args.double_encoded_rate,
+        solve_time=args.solve_time,
+        callback_drop_rate=args.callback_drop_rate,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(build_app(config_from_args(args)), host=args.host, port=args.port, access_log=None)